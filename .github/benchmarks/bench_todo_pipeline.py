@@ -0,0 +1,260 @@
+"""
+Benchmarks for the TODO-to-Issues pipeline on a synthetic repository.
+
+Generates a repository of configurable size and times each phase separately:
+file listing, scanning, metadata/label extraction, duplicate detection and
+issue body rendering. Results are written as JSON and can be compared against
+a stored baseline to flag regressions.
+
+    python3 .github/benchmarks/bench_todo_pipeline.py --files 5000 --output bench.json
+    python3 .github/benchmarks/bench_todo_pipeline.py --baseline baseline.json --tolerance 0.25 --min-delta 0.05
+
+Baselines are only meaningful from the same machine: compare two builds run
+back to back in one job rather than against results from another runner.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+from pathlib import Path
+
+# Add the scripts directory to path to allow importing
+sys.path.append(str(Path(__file__).parent.parent / "scripts"))
+
+from todo_to_issues import (
+    collect_candidate_files, scan_files, parse_todo_marker, extract_labels_from_metadata,
+    DuplicateIndex, render_issue_body, update_reference_section, load_config
+)
+
+RESULTS_VERSION = 1
+
+# Extension -> line comment prefix used when writing TODOs into generated files
+LANGUAGES = {
+    '.py': '#',
+    '.sh': '#',
+    '.rb': '#',
+    '.js': '//',
+    '.ts': '//',
+    '.go': '//',
+    '.java': '//',
+    '.sql': '--',
+}
+
+PRIORITIES = ['critical', 'high', 'medium', 'low']
+TYPES = ['bug', 'feature', 'refactor', 'performance', 'security']
+WORDS = ['cache', 'login', 'parser', 'upload', 'retry', 'session', 'index', 'query', 'render',
+         'payment', 'schema', 'migration', 'token', 'queue', 'report', 'export', 'search']
+
+def synthetic_title(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 6))).capitalize()
+
+def generate_repository(root, files=1000, lines_per_file=200, todo_density=0.01,
+                        languages=None, excluded_files=200, excluded_depth=6,
+                        binary_blobs=20, seed=0):
+    """Write a synthetic repository under root and return the canonical titles it contains.
+
+    todo_density is the fraction of lines carrying a TODO marker; roughly one in
+    four markers is a REF to an earlier canonical title. excluded_files are put
+    in a node_modules tree excluded_depth directories deep, and binary_blobs
+    files with code extensions are filled with random bytes.
+    """
+    rng = random.Random(seed)
+    languages = languages or list(LANGUAGES)
+    root = Path(root)
+    titles = []
+
+    for i in range(files):
+        ext = languages[i % len(languages)]
+        prefix = LANGUAGES.get(ext, '#')
+        path = root / f"pkg{i % 37}" / f"module_{i}{ext}"
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        lines = []
+        for n in range(lines_per_file):
+            if rng.random() < todo_density:
+                if titles and rng.random() < 0.25:
+                    lines.append(f"{prefix} TODO(REF: {rng.choice(titles)}): also here")
+                else:
+                    title = f"{synthetic_title(rng)} {len(titles)}"
+                    titles.append(title)
+                    lines.append(
+                        f"{prefix} TODO(TITLE: {title}, PRIORITY: {rng.choice(PRIORITIES)}, "
+                        f"TYPE: {rng.choice(TYPES)}): details for line {n}"
+                    )
+            else:
+                lines.append(f"value_{n} = compute({n}, 'text')")
+        path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+    excluded = root.joinpath('node_modules', *[f"dep{d}" for d in range(excluded_depth)])
+    excluded.mkdir(parents=True, exist_ok=True)
+    for i in range(excluded_files):
+        (excluded / f"vendor_{i}.js").write_text("// TODO(TITLE: Vendored)\n" * 10, encoding='utf-8')
+
+    for i in range(binary_blobs):
+        (root / f"blob_{i}.py").write_bytes(rng.randbytes(64 * 1024))
+
+    return titles
+
+def time_phase(fn, repeat):
+    """Run fn repeat times and return (timings, last result)"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+def run_benchmarks(root, config, repeat=3, jobs=None, existing_issues=2000):
+    """Time every pipeline phase against the repository at root"""
+    results = {}
+
+    def record(name, timings, items):
+        results[name] = {
+            'seconds': statistics.median(timings),
+            'min_seconds': min(timings),
+            'runs': timings,
+            'items': items
+        }
+
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        timings, files = time_phase(lambda: collect_candidate_files(config, source='filesystem'), repeat)
+        record('walk', timings, len(files))
+
+        timings, scanned = time_phase(lambda: scan_files(files, config, jobs=jobs), repeat)
+        canonical_todos, referenced_todos, _ = scanned
+        record('scan', timings, len(files))
+    finally:
+        os.chdir(cwd)
+
+    lines = [todo.text for todo in canonical_todos.values()]
+    lines += [ref.text for refs in referenced_todos.values() for ref in refs]
+
+    def extract():
+        for line in lines:
+            marker = parse_todo_marker(line)
+            if marker:
+                extract_labels_from_metadata(marker.metadata, config)
+
+    timings, _ = time_phase(extract, repeat)
+    record('metadata', timings, len(lines))
+
+    rng = random.Random(1)
+    existing = [f"{synthetic_title(rng)} old {i}" for i in range(existing_issues)]
+
+    def detect():
+        index = DuplicateIndex(existing)
+        for title in canonical_todos:
+            index.find(title, threshold=config['duplicate_threshold'])
+            index.add(title)
+
+    timings, _ = time_phase(detect, repeat)
+    record('duplicates', timings, len(canonical_todos))
+
+    def render():
+        for title, todo in canonical_todos.items():
+            body = render_issue_body(todo, referenced_todos.get(title, []), 'owner/repo', 'a' * 40)
+            update_reference_section(body, referenced_todos.get(title, []), 'owner/repo', 'b' * 40)
+
+    timings, _ = time_phase(render, repeat)
+    record('render', timings, len(canonical_todos))
+
+    return results
+
+def compare_with_baseline(results, baseline, tolerance, min_delta=0.0):
+    """Return a list of (phase, baseline seconds, current seconds) that regressed beyond tolerance.
+
+    A phase only counts as regressed when it is both more than tolerance slower
+    and at least min_delta seconds slower, so millisecond-scale phases cannot
+    fail on timer and scheduler noise alone.
+    """
+    regressions = []
+    for phase, current in results['phases'].items():
+        previous = baseline.get('phases', {}).get(phase)
+        if not previous or previous['items'] != current['items']:
+            continue
+        slower = current['seconds'] - previous['seconds']
+        if current['seconds'] > previous['seconds'] * (1 + tolerance) and slower >= min_delta:
+            regressions.append((phase, previous['seconds'], current['seconds']))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the TODO-to-Issues pipeline on a synthetic repository')
+    parser.add_argument('--files', type=int, default=2000, help='Number of source files to generate')
+    parser.add_argument('--lines', type=int, default=200, help='Lines per generated file')
+    parser.add_argument('--todo-density', type=float, default=0.01, help='Fraction of lines that carry a TODO marker')
+    parser.add_argument('--languages', default=','.join(LANGUAGES), help='Comma-separated extensions to generate')
+    parser.add_argument('--excluded-files', type=int, default=500, help='Files placed in a deep excluded directory')
+    parser.add_argument('--excluded-depth', type=int, default=6, help='Depth of the excluded directory tree')
+    parser.add_argument('--binary-blobs', type=int, default=20, help='Binary files with code extensions')
+    parser.add_argument('--existing-issues', type=int, default=2000, help='Existing issue titles for duplicate detection')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per phase (the median is reported)')
+    parser.add_argument('--jobs', type=int, default=None, help='Scan worker processes (default: CPU count)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the generator')
+    parser.add_argument('--output', help='Write JSON results to this file')
+    parser.add_argument('--baseline', help='Compare against a previous JSON result and fail on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown versus the baseline (0.25 = 25%%)')
+    parser.add_argument('--min-delta', type=float, default=0.05, help='Smallest slowdown in seconds that can count as a regression')
+    args = parser.parse_args()
+
+    config = load_config()
+    params = {
+        'files': args.files, 'lines': args.lines, 'todo_density': args.todo_density,
+        'languages': args.languages.split(','), 'excluded_files': args.excluded_files,
+        'excluded_depth': args.excluded_depth, 'binary_blobs': args.binary_blobs,
+        'existing_issues': args.existing_issues, 'seed': args.seed, 'jobs': args.jobs
+    }
+
+    root = tempfile.mkdtemp(prefix='todo-bench-')
+    try:
+        print(f"Generating synthetic repository in {root}")
+        titles = generate_repository(
+            root, files=args.files, lines_per_file=args.lines, todo_density=args.todo_density,
+            languages=params['languages'], excluded_files=args.excluded_files,
+            excluded_depth=args.excluded_depth, binary_blobs=args.binary_blobs, seed=args.seed
+        )
+        print(f"Generated {args.files} files with {len(titles)} canonical TODOs")
+        phases = run_benchmarks(root, config, repeat=args.repeat, jobs=args.jobs,
+                                existing_issues=args.existing_issues)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    results = {
+        'version': RESULTS_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'params': params,
+        'phases': phases
+    }
+
+    print(f"\n{'Phase':<12} {'Median (s)':>12} {'Items':>10}")
+    for phase, result in phases.items():
+        print(f"{phase:<12} {result['seconds']:>12.4f} {result['items']:>10}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.tolerance, args.min_delta)
+        for phase, before, after in regressions:
+            print(f"REGRESSION: {phase} took {after:.4f}s (baseline {before:.4f}s)")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline")
+
+if __name__ == "__main__":
+    main()
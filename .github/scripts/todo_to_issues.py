@@ -1,10 +1,23 @@
 import os
 import re
-import yaml
+import sys
+import json
+import mmap
+import gzip
+import hashlib
+import zlib
+import subprocess
 import argparse
+import random
+import threading
+import time
+import datetime
 from pathlib import Path
-from github import Github
-from collections import defaultdict
+from collections import Counter, defaultdict, namedtuple
+from dataclasses import dataclass, field
+from functools import lru_cache, partial
+from contextlib import contextmanager
+from urllib.parse import urlparse
 import textwrap
 from difflib import SequenceMatcher
 
@@ -16,16 +29,28 @@ def load_config():
         'exclude_directories': ['.git', '.venv', 'venv', 'node_modules', '__pycache__', '.pytest_cache', 'dist', 'build'],
         'exclude_extensions': ['.md', '.txt', '.rst', '.html', '.xml', '.json', '.yaml', '.yml', '.toml', '.ini', '.cfg'],
         'auto_close': True,
-        'duplicate_threshold': 0.85
+        'duplicate_threshold': 0.85,
+        'max_file_size': 2 * 1024 * 1024,
+        'file_source': 'auto'
     }
 
     config_path = Path('.github/todo-config.yml')
     if config_path.exists():
+        # Imported here so runs without a config file (and `scan`) start faster
+        import yaml
         try:
             with open(config_path, 'r') as f:
                 user_config = yaml.safe_load(f)
                 if user_config:
                     config.update(user_config)
+            for keyword, kind in list((config.get('marker_keywords') or {}).items()):
+                if kind not in MARKER_KINDS:
+                    print(f"Warning: Ignoring marker keyword '{keyword}' with unknown kind '{kind}'")
+                    del config['marker_keywords'][keyword]
+            for extension, style in list((config.get('comment_styles') or {}).items()):
+                if isinstance(style, str) and style not in COMMENT_STYLES:
+                    print(f"Warning: Ignoring unknown comment style '{style}' for '{extension}'")
+                    del config['comment_styles'][extension]
             print(f"Loaded configuration from {config_path}")
         except Exception as e:
             print(f"Warning: Could not load config file: {e}")
@@ -40,11 +65,89 @@ def similarity_ratio(s1, s2):
 
 def find_duplicate(title, existing_titles, threshold=0.85):
     """Find potential duplicate based on similarity threshold"""
+    matcher = SequenceMatcher(None, title.lower())
     for existing_title in existing_titles:
-        if similarity_ratio(title, existing_title) >= threshold:
+        matcher.set_seq2(existing_title.lower())
+        # Cheap upper bounds first; only the survivors pay for the full ratio
+        if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+            continue
+        if matcher.ratio() >= threshold:
             return existing_title
     return None
 
+# How many of the best n-gram candidates get an exact similarity check
+DUPLICATE_MAX_CANDIDATES = 20
+
+def title_ngrams(title, n=3):
+    """Character n-grams of a normalised title, padded so short words still produce grams"""
+    text = f" {' '.join(title.lower().split())} "
+    if len(text) <= n:
+        return {text}
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+class DuplicateIndex:
+    """Inverted character-trigram index over titles for near-duplicate lookups.
+
+    Instead of comparing a title with every known title, find() drops titles
+    whose length alone rules out the threshold, shortlists the rest by the
+    Dice coefficient of their trigram sets (so long titles that merely contain
+    the probe do not crowd out a true near-duplicate), prunes them with the
+    cheap real_quick_ratio/quick_ratio bounds and only then runs the exact
+    similarity_ratio check against the threshold.
+    """
+
+    def __init__(self, titles=(), max_candidates=DUPLICATE_MAX_CANDIDATES):
+        self.max_candidates = max_candidates
+        self.titles = []
+        self.gram_counts = []
+        self.postings = defaultdict(list)
+        for title in titles:
+            self.add(title)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def add(self, title):
+        """Index a title so later lookups can match it"""
+        index = len(self.titles)
+        grams = title_ngrams(title)
+        self.titles.append(title)
+        self.gram_counts.append(len(grams))
+        for gram in grams:
+            self.postings[gram].append(index)
+
+    def find(self, title, threshold=0.85):
+        """Return the most similar indexed title with a ratio >= threshold, or None"""
+        grams = title_ngrams(title)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        if not shared:
+            return None
+
+        length = len(title)
+        scored = []
+        for index, count in shared.items():
+            # 2*min/(sum) is the real_quick_ratio bound: no alignment can beat it
+            other = len(self.titles[index])
+            if 2 * min(length, other) < threshold * (length + other):
+                continue
+            dice = 2 * count / (len(grams) + self.gram_counts[index])
+            scored.append((-dice, index))
+        candidates = sorted(scored)[:self.max_candidates]
+
+        matcher = SequenceMatcher(None, title.lower())
+        best_title, best_ratio = None, threshold
+        for _, index in candidates:
+            candidate = self.titles[index]
+            matcher.set_seq2(candidate.lower())
+            if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= best_ratio and (best_title is None or ratio > best_ratio):
+                best_title, best_ratio = candidate, ratio
+        return best_title
+
 def parse_metadata(metadata_str):
     """Parse metadata string into dict of key-value pairs"""
     metadata = {}
@@ -59,35 +162,42 @@ def parse_metadata(metadata_str):
     
     return metadata
 
+# Label mapping for metadata
+PRIORITY_LABELS = {
+    'critical': 'priority:critical',
+    'high': 'priority:high',
+    'medium': 'priority:medium',
+    'low': 'priority:low'
+}
+
+TYPE_LABELS = {
+    'bug': 'type:bug',
+    'feature': 'type:feature',
+    'refactor': 'type:refactor',
+    'documentation': 'type:documentation',
+    'test': 'type:test',
+    'performance': 'type:performance',
+    'security': 'type:security',
+    'accessibility': 'type:accessibility'
+}
+
+EFFORT_LABELS = {
+    'small': 'effort:small',
+    'medium': 'effort:medium',
+    'large': 'effort:large',
+    'xlarge': 'effort:xlarge'
+}
+
+# Metadata keys whose values must come from a fixed set
+METADATA_LABELS = {
+    'PRIORITY': PRIORITY_LABELS,
+    'TYPE': TYPE_LABELS,
+    'EFFORT': EFFORT_LABELS
+}
+
 def extract_labels_from_metadata(metadata, config):
     """Convert metadata to GitHub labels"""
     labels = config['default_labels'].copy()
-    
-    # Label mapping for metadata
-    PRIORITY_LABELS = {
-        'critical': 'priority:critical',
-        'high': 'priority:high',
-        'medium': 'priority:medium',
-        'low': 'priority:low'
-    }
-    
-    TYPE_LABELS = {
-        'bug': 'type:bug',
-        'feature': 'type:feature',
-        'refactor': 'type:refactor',
-        'documentation': 'type:documentation',
-        'test': 'type:test',
-        'performance': 'type:performance',
-        'security': 'type:security',
-        'accessibility': 'type:accessibility'
-    }
-    
-    EFFORT_LABELS = {
-        'small': 'effort:small',
-        'medium': 'effort:medium',
-        'large': 'effort:large',
-        'xlarge': 'effort:xlarge'
-    }
 
     if 'PRIORITY' in metadata:
         priority = metadata['PRIORITY'].lower()
@@ -106,160 +216,2463 @@ def extract_labels_from_metadata(metadata, config):
     
     if 'EPIC' in metadata:
         labels.append(f"epic:{metadata['EPIC'].lower().replace(' ', '-')}")
+
+    # AUTHORED is added by blame enrichment
+    age_labels = config.get('age_labels', DEFAULT_AGE_LABELS)
+    if 'AUTHORED' in metadata and age_labels:
+        try:
+            label = age_label(metadata['AUTHORED'], age_labels)
+        except ValueError:
+            label = None
+        if label:
+            labels.append(label)
     
     return labels
 
-def main():
-    parser = argparse.ArgumentParser(description='Convert TODOs to GitHub Issues')
-    parser.add_argument('--token', help='GitHub Token', required=False)
-    parser.add_argument('--repo', help='Repository Name (owner/repo)', required=False)
-    parser.add_argument('--sha', help='Commit SHA', required=False)
-    parser.add_argument('--dry-run', action='store_true', help='Do not create issues, just print what would happen')
-    args = parser.parse_args()
+# Marker keywords recognised inside TODO(...) and the kind of TODO they declare.
+# Extra keywords can be added through `marker_keywords` in todo-config.yml.
+MARKER_KINDS = ('canonical', 'reference')
+DEFAULT_MARKER_KEYWORDS = {
+    'TITLE': 'canonical',
+    'REF': 'reference'
+}
 
-    # Get credentials from args or env vars
-    token = args.token or os.environ.get('GITHUB_TOKEN')
-    repo_name = args.repo or os.environ.get('REPO_NAME')
-    commit_sha = args.sha or os.environ.get('COMMIT_SHA') or 'unknown-sha'
+TodoMarker = namedtuple('TodoMarker', ['kind', 'keyword', 'title', 'metadata', 'description'])
 
-    if not args.dry_run and (not token or not repo_name):
-        print("Error: GITHUB_TOKEN and REPO_NAME are required for non-dry-run mode")
-        return
+@lru_cache(maxsize=None)
+def build_marker_pattern(keywords):
+    """Compile one regex that matches a TODO marker for any of the given keywords"""
+    # Longest first so a keyword that prefixes another cannot shadow it
+    alternation = '|'.join(re.escape(k) for k in sorted(keywords, key=len, reverse=True))
+    return re.compile(
+        rf'(?<!\w)TODO\((?P<keyword>{alternation}):\s*(?P<title>[^,)]+)'
+        r'(?:,\s*(?P<metadata>[^)]*))?\)(?::\s*(?P<description>.*))?',
+        re.IGNORECASE
+    )
 
-    config = load_config()
+def marker_keywords(config):
+    """Return the keyword -> kind map for a configuration"""
+    keywords = dict(DEFAULT_MARKER_KEYWORDS)
+    for keyword, kind in (config.get('marker_keywords') or {}).items():
+        keywords[str(keyword).upper()] = kind
+    return keywords
 
-    # Initialize GitHub client if not dry run
-    repo = None
-    if not args.dry_run:
-        g = Github(token)
-        repo = g.get_repo(repo_name)
+def parse_todo_marker(line, keywords=None):
+    """Parse the TODO marker on a line in a single pass.
 
-    print("=" * 80)
-    print("SCANNING REPOSITORY FOR TODOs")
-    print("=" * 80)
+    Returns a TodoMarker with the marker kind ('canonical' or 'reference'), the
+    keyword that matched, the title, the parsed metadata dict and the free-text
+    description (empty if none), or None if the line has no marker.
+    """
+    keywords = keywords or DEFAULT_MARKER_KEYWORDS
+    match = build_marker_pattern(tuple(sorted(keywords))).search(line)
+    if not match:
+        return None
 
-    # Regex patterns for TODOs with optional metadata
-    canonical_pattern = re.compile(
-        r'#\s*TODO\(TITLE:\s*([^,)]+)(?:,\s*([^)]*))?\)(?::\s*(.*))?',
-        re.IGNORECASE
+    keyword = match.group('keyword').upper()
+    return TodoMarker(
+        kind=keywords[keyword],
+        keyword=keyword,
+        title=match.group('title').strip(),
+        metadata=parse_metadata(match.group('metadata')),
+        description=match.group('description').strip() if match.group('description') else ""
     )
-    referenced_pattern = re.compile(
-        r'#\s*TODO\(REF:\s*([^,)]+)(?:,\s*([^)]*))?\)(?::\s*(.*))?',
-        re.IGNORECASE
+
+MARKER_HEAD = re.compile(r'TODO\(\s*(\w*)(\s*:)?', re.IGNORECASE)
+# How close an unknown word must be to a configured keyword to count as a typo of it
+KEYWORD_TYPO_RATIO = 0.75
+
+def marker_problems(text, keywords=None):
+    """Describe what is wrong with the TODO( marker in text; an empty list means it is well-formed.
+
+    TODO( markers that do not look like this tool's syntax, such as TODO(alice)
+    or TODO(), are someone else's convention and are not reported.
+    """
+    keywords = keywords or DEFAULT_MARKER_KEYWORDS
+    match = build_marker_pattern(tuple(sorted(keywords))).search(text)
+    if not match:
+        head = MARKER_HEAD.search(text)
+        keyword = head.group(1) if head else ""
+        if keyword.upper() in keywords:
+            return [f"expected TODO({keyword.upper()}: title[, KEY: value...])"]
+        typo = keyword and any(similarity_ratio(keyword, known) >= KEYWORD_TYPO_RATIO for known in keywords)
+        if (head and head.group(2) and keyword) or typo:
+            return [f"unknown keyword '{keyword}' (expected {', '.join(sorted(keywords))})"]
+        return []
+
+    problems = []
+    if not match.group('title').strip():
+        problems.append("empty title")
+    for pair in (match.group('metadata') or "").split(','):
+        pair = pair.strip()
+        if not pair:
+            continue
+        key, sep, value = pair.partition(':')
+        if not sep:
+            problems.append(f"metadata '{pair}' is not KEY: value")
+            continue
+        key, value = key.strip().upper(), value.strip()
+        allowed = METADATA_LABELS.get(key)
+        if allowed and value.lower() not in allowed:
+            problems.append(f"unknown {key} '{value}' (expected {', '.join(allowed)})")
+    return problems
+
+@dataclass(slots=True)
+class TodoRecord:
+    """One TODO marker found by the scanner.
+
+    note is the free text after the marker. The issue description and labels are
+    derived from it and the metadata on demand instead of being stored per record.
+    """
+    kind: str
+    title: str
+    file: str
+    line: int
+    text: str
+    note: str = ""
+    metadata: dict = field(default_factory=dict)
+
+    @property
+    def description(self):
+        if self.kind == 'canonical':
+            return f"{self.title}: {self.note}" if self.note else self.title
+        return self.note or "Reference"
+
+    def labels(self, config):
+        return extract_labels_from_metadata(self.metadata, config)
+
+    def to_row(self):
+        """Compact list form used by the on-disk index (the file path is stored once per file)"""
+        return [self.kind, self.title, self.line, self.text, self.note, self.metadata]
+
+    @classmethod
+    def from_row(cls, file_path, row):
+        kind, title, line, text, note, metadata = row
+        return cls(kind, title, file_path, line, text, note, metadata)
+
+# Comment syntax per language family: line comment tokens, block comment
+# (open, close) pairs and string delimiters whose contents are skipped.
+# Triple-quoted and backtick strings may span lines; other strings end at a newline.
+COMMENT_STYLES = {
+    'python': {'line': ['#'], 'strings': ['"""', "'''", '"', "'"]},
+    'shell': {'line': ['#'], 'strings': ['"', "'"]},
+    'c': {'line': ['//'], 'block': [['/*', '*/']], 'strings': ['"', "'"]},
+    'javascript': {'line': ['//'], 'block': [['/*', '*/']], 'strings': ['"', "'", '`']},
+    'rust': {'line': ['//'], 'block': [['/*', '*/']], 'strings': ['"']},
+    'kotlin': {'line': ['//'], 'block': [['/*', '*/']], 'strings': ['"""', '"', "'"]},
+    'php': {'line': ['//', '#'], 'block': [['/*', '*/']], 'strings': ['"', "'"]},
+    'sql': {'line': ['--'], 'block': [['/*', '*/']], 'strings': ["'", '"']},
+}
+
+# Extension -> comment style. `comment_styles` in todo-config.yml can add or
+# override entries with a style name or an inline {line, block, strings} mapping.
+EXTENSION_COMMENT_STYLES = {
+    '.py': 'python',
+    '.sh': 'shell', '.bash': 'shell', '.rb': 'shell', '.r': 'shell',
+    '.c': 'c', '.h': 'c', '.cpp': 'c', '.hpp': 'c', '.cs': 'c', '.java': 'c', '.m': 'c',
+    # Go raw strings use backticks like JavaScript template literals
+    '.js': 'javascript', '.jsx': 'javascript', '.ts': 'javascript', '.tsx': 'javascript', '.go': 'javascript',
+    '.rs': 'rust',
+    '.swift': 'kotlin', '.kt': 'kotlin', '.scala': 'kotlin',
+    '.php': 'php',
+    '.sql': 'sql',
+}
+FALLBACK_COMMENT_STYLE = 'shell'
+
+class CommentScanner:
+    """Finds the comment regions of source bytes for one comment style.
+
+    A single precompiled alternation of every comment and string opener jumps
+    from token to token, so the work per file is proportional to the number of
+    comments and strings rather than the number of lines.
+    """
+
+    def __init__(self, line=(), block=(), strings=()):
+        self.line_tokens = {token.encode() for token in line}
+        self.block_tokens = {start.encode(): end.encode() for start, end in block}
+        self.string_ends = {}
+        for quote in strings:
+            q = re.escape(quote.encode())
+            if len(quote) > 1 or quote == '`':
+                self.string_ends[quote.encode()] = re.compile(rb'(?:\\.|[^\\])*?(?:' + q + rb'|\Z)', re.S)
+            else:
+                self.string_ends[quote.encode()] = re.compile(rb'(?:\\.|[^\\\n' + q + rb'])*(?:' + q + rb'|\n|\Z)', re.S)
+
+        # Longest first so '"""' wins over '"'
+        tokens = sorted([*self.line_tokens, *self.block_tokens, *self.string_ends], key=len, reverse=True)
+        self.token_pattern = re.compile(b'|'.join(re.escape(token) for token in tokens)) if tokens else None
+
+    def comment_regions(self, data):
+        """Yield (start, end) byte offsets of comment bodies, skipping string literals"""
+        if self.token_pattern is None:
+            return
+        size = len(data)
+        pos = 0
+        while True:
+            match = self.token_pattern.search(data, pos)
+            if not match:
+                return
+            token = match.group()
+            if token in self.line_tokens:
+                end = data.find(b'\n', match.end())
+                end = size if end == -1 else end
+                yield match.end(), end
+                pos = end
+            elif token in self.block_tokens:
+                close = self.block_tokens[token]
+                end = data.find(close, match.end())
+                if end == -1:
+                    yield match.end(), size
+                    return
+                yield match.end(), end
+                pos = end + len(close)
+            else:
+                pos = self.string_ends[token].match(data, match.end()).end()
+
+@lru_cache(maxsize=None)
+def build_comment_scanner(line, block, strings):
+    return CommentScanner(line, block, strings)
+
+def comment_scanner_for(file_path, config):
+    """Return the CommentScanner for a file based on its extension"""
+    extension = os.path.splitext(file_path)[1].lower()
+    style = (config.get('comment_styles') or {}).get(extension)
+    style = style or EXTENSION_COMMENT_STYLES.get(extension, FALLBACK_COMMENT_STYLE)
+    if isinstance(style, str):
+        if style not in COMMENT_STYLES:
+            raise ValueError(f"unknown comment style '{style}'")
+        style = COMMENT_STYLES[style]
+    return build_comment_scanner(
+        tuple(style.get('line') or ()),
+        tuple(tuple(pair) for pair in style.get('block') or ()),
+        tuple(style.get('strings') or ())
     )
 
-    canonical_todos = {}
-    referenced_todos = defaultdict(list)
+# Every marker starts with "TODO(", so a file without it can be skipped before decoding
+TODO_MARKER_PREFILTER = re.compile(rb'todo\(', re.IGNORECASE)
+# A NUL byte in this many leading bytes marks a file as binary
+BINARY_SNIFF_BYTES = 8192
+DEFAULT_MAX_FILE_SIZE = 2 * 1024 * 1024
+
+# Below this many files the process pool costs more than it saves
+PARALLEL_SCAN_MIN_FILES = 64
+
+def default_jobs():
+    """Number of scan workers to use when --jobs is not given"""
+    return os.cpu_count() or 1
 
+FILE_SOURCES = ('auto', 'git', 'filesystem')
+
+def is_candidate_name(name, code_extensions, exclude_extensions):
+    """Check a file name against the extension filters without touching the filesystem"""
+    suffix = os.path.splitext(name)[1].lower()
+    return suffix in code_extensions and suffix not in exclude_extensions
+
+def walk_candidate_files(config, root='.'):
+    """Walk the working tree (or a directory in it), pruning excluded directories before descending into them"""
     exclude_dirs = set(config['exclude_directories'])
     exclude_extensions = set(config['exclude_extensions'])
     code_extensions = set(config['include_extensions'])
-    
-    for file_path in Path('.').rglob('*'):
-        if any(ex in file_path.parts for ex in exclude_dirs):
+
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in exclude_dirs]
+        rel_dir = '' if dirpath == '.' else os.path.normpath(dirpath)
+        for name in filenames:
+            if not is_candidate_name(name, code_extensions, exclude_extensions):
+                continue
+            path = os.path.join(rel_dir, name) if rel_dir else name
+            if os.path.isfile(path):
+                yield path
+
+def git_candidate_files(config):
+    """List tracked and untracked-but-not-ignored files with git ls-files.
+
+    Returns None if git is unavailable or the current directory is not a work tree.
+    """
+    output = run_git('ls-files', '-z', '--cached', '--others', '--exclude-standard')
+    if output is None:
+        return None
+
+    exclude_dirs = set(config['exclude_directories'])
+    exclude_extensions = set(config['exclude_extensions'])
+    code_extensions = set(config['include_extensions'])
+
+    files = []
+    for path in output.split('\0'):
+        if not path:
+            continue
+        parts = path.split('/')
+        if not is_candidate_name(parts[-1], code_extensions, exclude_extensions):
             continue
-        if not file_path.is_file():
+        if not exclude_dirs.isdisjoint(parts[:-1]):
+            continue
+        # Tracked files deleted from the working tree are still listed
+        if os.path.isfile(path):
+            files.append(os.path.join(*parts))
+    return files
+
+def collect_candidate_files(config, source=None):
+    """Return the files to scan, sorted by path so every run sees them in the same order.
+
+    source is 'git' (git ls-files, honouring .gitignore), 'filesystem' (pruning
+    directory walk) or 'auto' (git when available, otherwise the walk).
+    """
+    source = source or config.get('file_source', 'auto')
+
+    files = None
+    if source in ('auto', 'git'):
+        files = git_candidate_files(config)
+        if files is None and source == 'git':
+            print("Warning: git ls-files failed. Falling back to a directory walk.")
+    if files is None:
+        files = list(walk_candidate_files(config))
+
+    files.sort()
+    return files
+
+def find_marker_lines(data, scanner=None):
+    """Yield (line_num, line, comment) for the lines of a buffer that contain a TODO( marker.
+
+    data is bytes or an mmap and is searched as raw bytes; only the lines around
+    each hit are decoded. With a CommentScanner, only hits inside comments count
+    and comment is the part of the line inside the comment; without one, comment
+    is the whole line.
+    """
+    # Only buffers that mention a marker at all are tokenized
+    if not TODO_MARKER_PREFILTER.search(data):
+        return
+
+    size = len(data)
+    regions = scanner.comment_regions(data) if scanner else [(0, size)]
+    line_num = 1
+    counted_to = 0
+    last_line_start = -1
+    for region_start, region_end in regions:
+        pos = region_start
+        while pos < region_end:
+            match = TODO_MARKER_PREFILTER.search(data, pos, region_end)
+            if not match:
+                break
+
+            line_start = data.rfind(b'\n', 0, match.start()) + 1
+            line_end = data.find(b'\n', match.end())
+            if line_end == -1:
+                line_end = size
+            pos = line_end + 1
+            if line_start == last_line_start:
+                continue
+            last_line_start = line_start
+
+            line_num += data[counted_to:line_start].count(b'\n')
+            counted_to = line_start
+            comment = data[max(line_start, region_start):min(line_end, region_end)]
+            yield (line_num, data[line_start:line_end].decode('utf-8', errors='replace'),
+                   comment.decode('utf-8', errors='replace'))
+
+def iter_marker_lines(file_path, max_file_size=DEFAULT_MAX_FILE_SIZE, stats=None, scanner=None):
+    """Yield find_marker_lines results for a file.
+
+    The file is memory-mapped, so files without a marker are never decoded.
+    Empty, binary (NUL byte in the first block) and oversized files yield no
+    lines. If stats is a dict, the number of bytes searched is stored under
+    'bytes_read' and the reason a binary or oversized file was passed over
+    under 'skipped'.
+    """
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        if max_file_size and size > max_file_size:
+            if stats is not None:
+                stats['skipped'] = f"skipped: {size} bytes is over max_file_size ({max_file_size})"
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm.find(b'\0', 0, BINARY_SNIFF_BYTES) != -1:
+                if stats is not None:
+                    stats['skipped'] = "skipped: looks binary (NUL byte near the start)"
+                return
+            if stats is not None:
+                stats['bytes_read'] = size
+            yield from find_marker_lines(mm, scanner)
+
+def read_marker_lines(file_path, max_file_size=DEFAULT_MAX_FILE_SIZE, stats=None, scanner=None):
+    """List form of iter_marker_lines"""
+    return list(iter_marker_lines(file_path, max_file_size, stats, scanner))
+
+def match_markers(marker_lines, keywords):
+    """Yield (line_num, line, marker) for the lines whose comment carries a well-formed marker"""
+    for line_num, line, comment in marker_lines:
+        marker = parse_todo_marker(comment, keywords)
+        if marker:
+            yield line_num, line, marker
+
+def build_records(file_path, matches):
+    """Turn matched markers into TodoRecords"""
+    for line_num, line, marker in matches:
+        yield TodoRecord(
+            kind=marker.kind,
+            title=marker.title,
+            file=file_path,
+            line=line_num,
+            text=line.strip(),
+            note=marker.description,
+            metadata=marker.metadata
+        )
+
+def scan_file(file_path, config):
+    """Scan the comments of one file for TODO markers: read -> match -> record.
+
+    Returns a tuple of (records, error, bytes_read) where records is a list of
+    TodoRecords in line order. error is None or the reason the file could not be
+    read or was skipped (binary or over max_file_size); a file with an error may
+    still hold TODOs, so its issues must not be auto-closed. bytes_read is 0
+    for skipped files.
+    """
+    stats = {'bytes_read': 0}
+    try:
+        marker_lines = iter_marker_lines(
+            file_path, config.get('max_file_size', DEFAULT_MAX_FILE_SIZE), stats,
+            comment_scanner_for(file_path, config)
+        )
+        records = list(build_records(file_path, match_markers(marker_lines, marker_keywords(config))))
+    except (OSError, ValueError) as e:
+        return [], str(e), 0
+
+    return records, stats.get('skipped'), stats['bytes_read']
+
+def merge_scan_results(results):
+    """Merge a stream of per-file scan results into canonical and referenced TODO maps.
+
+    results must be in file order; the first canonical TODO seen for a title wins,
+    exactly as in a serial scan.
+    """
+    canonical_todos = {}
+    referenced_todos = defaultdict(list)
+    errors = []
+
+    for file_path, (records, error, *_) in results:
+        for record in records:
+            if record.kind == 'canonical':
+                if record.title not in canonical_todos:
+                    canonical_todos[record.title] = record
+            else:
+                referenced_todos[record.title].append(record)
+        if error:
+            errors.append((file_path, error))
+
+    return canonical_todos, referenced_todos, errors
+
+def iter_scan_results(file_paths, config, jobs=None):
+    """Yield (file_path, scan_file result) in the same order as file_paths.
+
+    Records coming back from worker processes get the caller's interned path
+    string, so all records of a file share one path object.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    jobs = jobs or default_jobs()
+    worker = partial(scan_file, config=config)
+
+    if jobs <= 1 or len(file_paths) < PARALLEL_SCAN_MIN_FILES:
+        results = map(worker, file_paths)
+        executor = None
+    else:
+        chunksize = max(1, len(file_paths) // (jobs * 4))
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        # Executor.map yields results in submission order, which keeps the merge deterministic
+        results = executor.map(worker, file_paths, chunksize=chunksize)
+
+    try:
+        for file_path, result in zip(file_paths, results):
+            file_path = sys.intern(file_path)
+            for record in result[0]:
+                record.file = file_path
+            yield file_path, result
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+
+def record_scan_stats(stats, results):
+    """Pass scan results through, adding file, byte and skipped-file counts to a stats Counter"""
+    for file_path, result in results:
+        if stats is not None:
+            stats['files_scanned'] += 1
+            stats['bytes_read'] += result[2]
+            if result[1]:
+                stats['files_skipped'] += 1
+        yield file_path, result
+
+def scan_files(file_paths, config, jobs=None, stats=None):
+    """Scan files for TODOs, spreading the work across a process pool.
+
+    Returns (canonical_todos, referenced_todos, errors). The result does not
+    depend on the number of jobs. If stats is a Counter, files_scanned and
+    bytes_read are added to it.
+    """
+    results = iter_scan_results(file_paths, config, jobs=jobs)
+    return merge_scan_results(record_scan_stats(stats, results))
+
+def iter_todos(file_paths=None, config=None, jobs=None):
+    """Stream the TodoRecords of a repository in file and line order.
+
+    This is the library entry point to the scanner. file_paths defaults to the
+    candidate files of the current directory and config to todo-config.yml.
+    Nothing is accumulated, so memory stays flat however many TODOs there are.
+    """
+    config = config or load_config()
+    if file_paths is None:
+        file_paths = collect_candidate_files(config)
+    for _, (records, _, _) in iter_scan_results(file_paths, config, jobs=jobs):
+        yield from records
+
+# Bump whenever the scanner output changes so stale indexes are rebuilt
+INDEX_VERSION = 5
+DEFAULT_INDEX_FILE = '.todo-cache/todo-index.json'
+
+def run_git(*args):
+    """Run a git command and return its stdout, or None if git fails"""
+    try:
+        result = subprocess.run(['git', *args], capture_output=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.decode('utf-8', errors='surrogateescape')
+
+def resolve_commit(commit_sha):
+    """Return the full SHA for commit_sha (or HEAD when unknown), or None outside a git repo"""
+    ref = 'HEAD' if not commit_sha or commit_sha == 'unknown-sha' else commit_sha
+    output = run_git('rev-parse', '--verify', '--quiet', f'{ref}^{{commit}}')
+    return output.strip() if output else None
+
+def git_blob_shas():
+    """Map every tracked path to its blob SHA in the git index"""
+    output = run_git('ls-files', '--stage', '-z')
+    if output is None:
+        return {}
+
+    blobs = {}
+    for entry in output.split('\0'):
+        if not entry:
             continue
-        if file_path.suffix.lower() in exclude_extensions:
+        info, path = entry.split('\t', 1)
+        blobs[path] = info.split()[1]
+    return blobs
+
+def git_changed_files(base_sha, head_sha):
+    """Return the set of paths changed between two commits, or None if git cannot tell"""
+    output = run_git('diff', '--name-only', '--no-renames', '-z', base_sha, head_sha)
+    if output is None:
+        return None
+    return {path for path in output.split('\0') if path}
+
+def git_modified_files():
+    """Return the set of tracked paths whose working copy differs from the git index"""
+    output = run_git('ls-files', '--modified', '-z')
+    if output is None:
+        return set()
+    return {path for path in output.split('\0') if path}
+
+def config_fingerprint(config):
+    """Hash of everything that influences scan output, used to invalidate the index"""
+    payload = json.dumps({'version': INDEX_VERSION, 'config': config}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def load_index(index_path, config):
+    """Load a persisted TODO index, or return None if it is missing or stale"""
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if index.get('fingerprint') != config_fingerprint(config):
+        print("TODO index was built with a different configuration. Rebuilding.")
+        return None
+    return index
+
+def save_index(index_path, index):
+    """Write the TODO index atomically"""
+    index_path = Path(index_path)
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = index_path.with_suffix(index_path.suffix + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, separators=(',', ':'))
+    os.replace(tmp_path, index_path)
+
+def incremental_scan_results(file_paths, config, index_path, commit_sha, jobs=None, stats=None):
+    """Scan only files that changed since the indexed commit and yield results for every file.
+
+    The index maps each path to its git blob SHA and scan result. Files are re-parsed
+    when git reports them changed since the last indexed commit, when their blob SHA
+    differs from the indexed one, when they have unstaged edits, or when they are
+    untracked. Yields
+    (file_path, (records, error)) in file order once the updated index is saved.
+    """
+    head_sha = resolve_commit(commit_sha)
+    blobs = git_blob_shas()
+    index = load_index(index_path, config)
+
+    indexed_files = index['files'] if index else {}
+    changed = None
+    if index and index.get('commit') and head_sha:
+        changed = git_changed_files(index['commit'], head_sha)
+    if changed is None:
+        changed = set()
+    # Blob SHAs come from the index, so unstaged edits must be caught separately
+    modified = git_modified_files()
+    changed |= modified
+
+    to_scan = []
+    for file_path in file_paths:
+        entry = indexed_files.get(file_path)
+        blob = blobs.get(Path(file_path).as_posix())
+        if (entry is None or blob is None or entry.get('blob') != blob
+                or Path(file_path).as_posix() in changed):
+            to_scan.append(file_path)
+
+    print(f"Incremental scan: re-parsing {len(to_scan)} of {len(file_paths)} file(s)")
+
+    results = record_scan_stats(stats, iter_scan_results(to_scan, config, jobs=jobs))
+    if stats is not None:
+        stats['files_from_index'] += len(file_paths) - len(to_scan)
+    for file_path, (records, error, _) in results:
+        posix_path = Path(file_path).as_posix()
+        indexed_files[file_path] = {
+            # A dirty file's hits do not belong to its index blob; force a rescan next time
+            'blob': None if posix_path in modified else blobs.get(posix_path),
+            'hits': [record.to_row() for record in records],
+            'error': error
+        }
+
+    # Keep only files that are still part of the scan, in scan order
+    files = {}
+    for file_path in file_paths:
+        files[file_path] = indexed_files[file_path]
+
+    save_index(index_path, {
+        'fingerprint': config_fingerprint(config),
+        'commit': head_sha,
+        'files': files
+    })
+
+    for file_path, entry in files.items():
+        yield file_path, ([TodoRecord.from_row(file_path, row) for row in entry['hits']], entry['error'])
+
+def incremental_scan(file_paths, config, index_path, commit_sha, jobs=None, stats=None):
+    """Incremental counterpart of scan_files; returns the same tuple"""
+    return merge_scan_results(
+        incremental_scan_results(file_paths, config, index_path, commit_sha, jobs=jobs, stats=stats)
+    )
+
+DEFAULT_BLAME_CACHE_FILE = '.todo-cache/blame-cache.json'
+BLAME_CACHE_VERSION = 1
+BLAME_BATCH_FILES = 256
+# Minimum age in days -> label; the oldest matching bucket wins
+DEFAULT_AGE_LABELS = {30: 'age:1-month', 180: 'age:6-months', 365: 'age:1-year'}
+BLAME_HEADER = re.compile(r'^[0-9a-f]{40,64} \d+ (\d+)')
+NOREPLY_EMAIL = re.compile(r'^(?:\d+\+)?([A-Za-z0-9-]+)@users\.noreply\.github\.com$', re.IGNORECASE)
+
+def parse_blame_porcelain(output):
+    """Return {line number: [commit, author, email, author time]} from git blame --porcelain output"""
+    commits = defaultdict(dict)
+    lines = {}
+    current = None
+    for line in output.splitlines():
+        if line.startswith('\t'):
             continue
-        if file_path.suffix.lower() not in code_extensions:
+        header = BLAME_HEADER.match(line)
+        if header:
+            current = line.split(' ', 1)[0]
+            lines[int(header.group(1))] = current
+        elif current is not None:
+            key, _, value = line.partition(' ')
+            commits[current].setdefault(key, value)
+
+    blame = {}
+    for line_num, commit in lines.items():
+        if not commit.strip('0'):
+            # Not committed yet: nothing to attribute
             continue
-        
+        info = commits[commit]
+        blame[line_num] = [commit, info.get('author', ''), info.get('author-mail', '').strip('<>'),
+                           int(info.get('author-time', 0))]
+    return blame
+
+def blame_lines(file_path, line_numbers):
+    """Blame just the given lines of a file with a single git blame call"""
+    command = ['git', 'blame', '--porcelain']
+    for line_num in sorted(line_numbers):
+        command += ['-L', f'{line_num},{line_num}']
+    result = subprocess.run([*command, '--', file_path], capture_output=True, check=True)
+    return parse_blame_porcelain(result.stdout.decode('utf-8', errors='replace'))
+
+def load_blame_cache(cache_path):
+    """Load the blob SHA -> {line: blame} cache, or an empty one"""
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache.get('blobs', {}) if cache.get('version') == BLAME_CACHE_VERSION else {}
+
+def save_blame_cache(cache_path, blobs):
+    """Write the blame cache atomically"""
+    cache_path = Path(cache_path)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(cache_path.suffix + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': BLAME_CACHE_VERSION, 'blobs': blobs}, f, separators=(',', ':'))
+    os.replace(tmp_path, cache_path)
+
+def default_assignee(email, config):
+    """GitHub login for a commit email, from author_map or a users.noreply.github.com address"""
+    author_map = {key.lower(): value for key, value in (config.get('author_map') or {}).items()}
+    if email.lower() in author_map:
+        return author_map[email.lower()]
+    match = NOREPLY_EMAIL.match(email)
+    return match.group(1) if match else None
+
+def age_label(authored, age_labels, today=None):
+    """Label for a TODO first written on the ISO date authored, or None if it is younger than every bucket"""
+    today = today or datetime.date.today()
+    age = (today - datetime.date.fromisoformat(authored)).days
+    buckets = {int(days): label for days, label in age_labels.items()}
+    matching = [days for days in buckets if age >= days]
+    return buckets[max(matching)] if matching else None
+
+def apply_blame(record, blame, config):
+    """Add AUTHOR, COMMIT and AUTHORED metadata (and a default ASSIGNEE) to a record; explicit metadata wins"""
+    commit, author, email, author_time = blame
+    metadata = {
+        'AUTHOR': author,
+        'COMMIT': commit[:7],
+        'AUTHORED': datetime.datetime.fromtimestamp(author_time, datetime.timezone.utc).date().isoformat()
+    }
+    assignee = default_assignee(email, config) if config.get('blame_assignees', True) else None
+    if assignee and record.kind == 'canonical':
+        metadata['ASSIGNEE'] = assignee
+    record.metadata = dict(metadata, **record.metadata)
+
+def blame_enriched_results(results, config, cache_path=DEFAULT_BLAME_CACHE_FILE, jobs=None, stats=None):
+    """Pass scan results through, adding blame metadata to every TODO.
+
+    Files with TODOs are handled in batches: each file gets one git blame call
+    covering all of its TODO lines, run on a thread pool, and the answers are
+    cached by git blob SHA so unchanged files are never blamed again. Files
+    with unstaged edits are blamed but not cached, since their lines do not
+    belong to the index blob. Files that are not tracked by git pass through
+    unchanged. The cache is saved once the stream is exhausted and keeps only
+    blobs seen in this run.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    cache = load_blame_cache(cache_path)
+    seen = {}
+    blobs = modified = None
+
+    def blame_batch(pool, batch):
+        nonlocal blobs, modified
+        answers = {}
+        futures = []
+        for file_path, result in batch:
+            records = result[0]
+            if not records:
+                continue
+            if blobs is None:
+                blobs, modified = git_blob_shas(), git_modified_files()
+                if (run_git('rev-parse', '--is-shallow-repository') or '').strip() == 'true':
+                    print("Warning: Shallow clone; blame attributes older lines to the oldest fetched commit. Fetch full history for accurate ages.")
+            posix_path = Path(file_path).as_posix()
+            blob = blobs.get(posix_path)
+            if blob is None:
+                continue
+            if posix_path in modified:
+                entry = {}
+            else:
+                entry = seen.setdefault(blob, cache.get(blob, {}))
+            answers[file_path] = entry
+            missing = {record.line for record in records if str(record.line) not in entry}
+            if missing:
+                futures.append((file_path, entry, pool.submit(blame_lines, file_path, missing)))
+            elif stats is not None:
+                stats['blame_cache_hits'] += 1
+
+        for file_path, entry, future in futures:
+            try:
+                blamed = future.result()
+            except (OSError, subprocess.CalledProcessError) as e:
+                print(f"Warning: Could not blame {file_path}: {e}")
+                continue
+            entry.update((str(line_num), blame) for line_num, blame in blamed.items())
+            if stats is not None:
+                stats['files_blamed'] += 1
+
+        for file_path, result in batch:
+            entry = answers.get(file_path, {})
+            for record in result[0]:
+                blame = entry.get(str(record.line))
+                if blame:
+                    apply_blame(record, blame, config)
+            yield file_path, result
+
+    with ThreadPoolExecutor(max_workers=min(32, default_jobs() * 2) if jobs is None else jobs) as pool:
+        batch = []
+        for item in results:
+            batch.append(item)
+            if len(batch) >= BLAME_BATCH_FILES:
+                yield from blame_batch(pool, batch)
+                batch = []
+        yield from blame_batch(pool, batch)
+
+    save_blame_cache(cache_path, seen)
+
+RESULTS_VERSION = 1
+
+def open_results(path, mode='r'):
+    """Open a results file as text, gzip-compressed when its name ends in .gz"""
+    if str(path).endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+def stream_results(path, results, config, commit_sha, shard=None):
+    """Pass scan results through while writing them to a versioned JSON Lines file.
+
+    The first line is a header with the format version, scanned commit, config
+    fingerprint and shard. Each following line is one TODO (with its derived
+    description and labels) or one unreadable file, in scan order. An end line
+    with the totals is written only once every result has been consumed, so an
+    interrupted scan never leaves a file that looks complete.
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    todos = 0
+    with open_results(path, 'w') as f:
+        f.write(json.dumps({
+            'type': 'header',
+            'version': RESULTS_VERSION,
+            'commit': commit_sha,
+            'fingerprint': config_fingerprint(config),
+            'shard': list(shard) if shard else None
+        }) + '\n')
+
+        for file_path, result in results:
+            records, error = result[0], result[1]
+            for record in records:
+                f.write(json.dumps({
+                    'type': 'todo',
+                    'file': file_path,
+                    'line': record.line,
+                    'kind': record.kind,
+                    'title': record.title,
+                    'note': record.note,
+                    'metadata': record.metadata,
+                    'description': record.description,
+                    'labels': record.labels(config),
+                    'text': record.text
+                }, ensure_ascii=False) + '\n')
+            todos += len(records)
+            if error:
+                f.write(json.dumps({'type': 'error', 'file': file_path, 'error': error}) + '\n')
+            yield file_path, result
+
+        f.write(json.dumps({'type': 'end', 'todos': todos}) + '\n')
+
+def read_results_header(path):
+    with open_results(path) as f:
+        header = json.loads(f.readline() or 'null')
+    if not header or header.get('type') != 'header':
+        raise ValueError(f"{path} is not a TODO results file")
+    if header.get('version') != RESULTS_VERSION:
+        raise ValueError(f"{path} has unsupported results version {header.get('version')}")
+    return header
+
+def iter_results(path):
+    """Yield (file_path, (records, error)) from a results file, in stored order.
+
+    Raises ValueError if the file is truncated (no end line) or its totals do not match.
+    """
+    read_results_header(path)
+    with open_results(path) as f:
+        f.readline()
+        current, records, error, todos = None, [], None, 0
+        for line in f:
+            item = json.loads(line)
+            if item['type'] == 'end':
+                if current is not None:
+                    yield current, (records, error)
+                if item['todos'] != todos:
+                    raise ValueError(f"{path} lists {todos} TODOs but its end line says {item['todos']}")
+                return
+
+            file_path = sys.intern(item['file'])
+            if file_path != current:
+                if current is not None:
+                    yield current, (records, error)
+                current, records, error = file_path, [], None
+            if item['type'] == 'error':
+                error = item['error']
+            else:
+                todos += 1
+                records.append(TodoRecord(
+                    item['kind'], item['title'], file_path, item['line'], item['text'], item['note'], item['metadata']
+                ))
+    raise ValueError(f"{path} is truncated")
+
+def load_scan_results(paths, config):
+    """Merge results files into (commit, canonical_todos, referenced_todos, errors).
+
+    Several files must be one complete set of shards for the same commit and
+    configuration: a missing shard would look like deleted TODOs and close
+    their issues. Raises ValueError otherwise.
+    """
+    headers = [read_results_header(path) for path in paths]
+    for key in ('commit', 'fingerprint'):
+        if len({str(header[key]) for header in headers}) > 1:
+            raise ValueError(f"results files disagree on {key}")
+    if headers[0]['fingerprint'] != config_fingerprint(config):
+        raise ValueError("results were scanned with a different configuration")
+
+    shards = [header['shard'] for header in headers]
+    if len(paths) > 1 or shards[0]:
+        if not all(shards):
+            raise ValueError("only sharded results can be combined")
+        count = shards[0][1]
+        numbers = sorted(shard[0] for shard in shards)
+        if any(shard[1] != count for shard in shards) or numbers != list(range(1, count + 1)):
+            raise ValueError(f"expected shards 1..{count} exactly once, got {numbers}")
+
+    if len(paths) == 1:
+        results = iter_results(paths[0])
+    else:
+        # Serial scans visit files sorted by path, so sorting the union reproduces their merge order
+        results = sorted((entry for path in paths for entry in iter_results(path)), key=lambda entry: entry[0])
+    return (headers[0]['commit'], *merge_scan_results(results))
+
+def api_endpoint(method, url, json_body=None):
+    """Normalise a request into an endpoint label such as 'PATCH /repos/{repo}/issues/{number}'"""
+    path = urlparse(url).path if url.startswith('http') else url.split('?', 1)[0]
+    path = re.sub(r'^/repos/[^/]+/[^/]+', '/repos/{repo}', path)
+    path = re.sub(r'/\d+(?=/|$)', '/{number}', path)
+    if path.endswith('/graphql') and json_body:
+        match = re.match(r'\s*(?:query|mutation)\s+(\w+)', json_body.get('query', ''))
+        if match:
+            path += f" ({match.group(1)})"
+    return f"{method} {path}"
+
+class Metrics:
+    """Wall and CPU time per phase, scan counters and GitHub API call statistics for one run.
+
+    CPU time includes reaped child processes, so scan workers are accounted for
+    once their pool has shut down.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.current = None
+        self.counters = Counter()
+        self.api_calls = Counter()
+        self.api_errors = Counter()
+        self.api_retries = Counter()
+        self.rate_limit_remaining = None
+
+    @staticmethod
+    def cpu_time():
+        times = os.times()
+        return times.user + times.system + times.children_user + times.children_system
+
+    def add_phase(self, name, wall, cpu):
+        with self.lock:
+            phase = self.phases.setdefault(name, {'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'count': 0})
+            phase['wall_seconds'] += wall
+            phase['cpu_seconds'] += cpu
+            phase['count'] += 1
+
+    @contextmanager
+    def phase(self, name):
+        """Time a block; repeated blocks with the same name accumulate"""
+        wall, cpu = time.perf_counter(), self.cpu_time()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - wall, self.cpu_time() - cpu)
+
+    def start_phase(self, name):
+        """End the current top-level phase (if any) and start timing the next one"""
+        self.end_phase()
+        self.current = (name, time.perf_counter(), self.cpu_time())
+
+    def end_phase(self):
+        if self.current:
+            name, wall, cpu = self.current
+            self.add_phase(name, time.perf_counter() - wall, self.cpu_time() - cpu)
+            self.current = None
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def record_api_call(self, endpoint, status, headers):
+        with self.lock:
+            self.api_calls[endpoint] += 1
+            if status >= 400:
+                self.api_errors[endpoint] += 1
+            remaining = headers.get('X-RateLimit-Remaining')
+            if remaining is not None:
+                self.rate_limit_remaining = int(remaining)
+
+    def record_retry(self, endpoint):
+        with self.lock:
+            self.api_retries[endpoint] += 1
+
+    def to_dict(self):
+        return {
+            'total_wall_seconds': round(time.perf_counter() - self.started, 4),
+            'phases': {
+                name: {key: round(value, 4) if isinstance(value, float) else value for key, value in phase.items()}
+                for name, phase in self.phases.items()
+            },
+            'counters': dict(self.counters),
+            'api': {
+                'total_calls': sum(self.api_calls.values()),
+                'calls': dict(self.api_calls),
+                'errors': dict(self.api_errors),
+                'retries': dict(self.api_retries),
+                'rate_limit_remaining': self.rate_limit_remaining
+            }
+        }
+
+    def write_json(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def job_summary(self):
+        """Render the metrics as GitHub-flavoured markdown for $GITHUB_STEP_SUMMARY"""
+        data = self.to_dict()
+        lines = ["## TODO to Issues run metrics", "",
+                 f"Total wall time: **{data['total_wall_seconds']:.2f}s**", "",
+                 "| Phase | Wall (s) | CPU (s) |", "|-------|---------:|--------:|"]
+        for name, phase in data['phases'].items():
+            lines.append(f"| {name} | {phase['wall_seconds']:.3f} | {phase['cpu_seconds']:.3f} |")
+
+        if data['counters']:
+            lines += ["", "| Counter | Value |", "|---------|------:|"]
+            lines += [f"| {name} | {value} |" for name, value in sorted(data['counters'].items())]
+
+        api = data['api']
+        if api['total_calls']:
+            lines += ["", "| Endpoint | Calls | Errors | Retries |", "|----------|------:|-------:|--------:|"]
+            for endpoint, calls in sorted(api['calls'].items()):
+                lines.append(f"| `{endpoint}` | {calls} | {api['errors'].get(endpoint, 0)} | {api['retries'].get(endpoint, 0)} |")
+            if api['rate_limit_remaining'] is not None:
+                lines += ["", f"Rate limit remaining: {api['rate_limit_remaining']}"]
+        return '\n'.join(lines) + '\n'
+
+DEFAULT_API_URL = 'https://api.github.com'
+DEFAULT_ISSUE_CACHE_FILE = '.todo-cache/issues.json'
+ISSUE_PAGE_SIZE = 100
+
+# Only the fields the sync phases read; bodies are needed for cross-reference updates
+IssueRecord = namedtuple('IssueRecord', ['number', 'title', 'state', 'body', 'node_id'])
+
+class GitHubError(Exception):
+    """An error response from the GitHub REST or GraphQL API"""
+
+    def __init__(self, message, status=None, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+# Seconds to wait for a connection or a response; requests waits forever by default
+DEFAULT_REQUEST_TIMEOUT = 30
+
+class GitHubClient:
+    """Thin GitHub API client on top of a requests session"""
+
+    def __init__(self, token, api_url=DEFAULT_API_URL, metrics=None, timeout=DEFAULT_REQUEST_TIMEOUT):
+        # requests is only needed for syncing, so `scan` never pays for importing it
+        import requests
+        self.requests = requests
+        self.metrics = metrics
+        self.timeout = timeout
+        self.headers = {
+            'Authorization': f'Bearer {token}',
+            'Accept': 'application/vnd.github+json',
+            'X-GitHub-Api-Version': '2022-11-28'
+        }
+        # requests sessions are not thread-safe, so each writer thread gets its own
+        self.local = threading.local()
+        self.api_url = api_url.rstrip('/')
+        # GitHub Enterprise serves REST under /api/v3 and GraphQL under /api/graphql
+        if self.api_url.endswith('/api/v3'):
+            self.graphql_url = self.api_url[:-len('/v3')] + '/graphql'
+        else:
+            self.graphql_url = self.api_url + '/graphql'
+
+    @property
+    def session(self):
+        if not hasattr(self.local, 'session'):
+            self.local.session = self.requests.Session()
+            self.local.session.headers.update(self.headers)
+        return self.local.session
+
+    def request(self, method, path, expected=(200, 201), **kwargs):
+        """Send a REST request and return the response, raising GitHubError on failure"""
+        url = path if path.startswith('http') else f"{self.api_url}{path}"
+        kwargs.setdefault('timeout', self.timeout)
+        response = self.session.request(method, url, **kwargs)
+        if self.metrics:
+            self.metrics.record_api_call(api_endpoint(method, path, kwargs.get('json')),
+                                         response.status_code, response.headers)
+        if response.status_code not in expected:
+            raise GitHubError(
+                f"{method} {path} failed with {response.status_code}: {response.text[:200]}",
+                status=response.status_code,
+                headers=response.headers
+            )
+        return response
+
+    def graphql(self, query, variables=None):
+        """Run a GraphQL query and return its data, raising GitHubError on errors"""
+        response = self.request('POST', self.graphql_url, json={'query': query, 'variables': variables or {}})
+        payload = response.json()
+        if payload.get('errors'):
+            messages = '; '.join(error.get('message', str(error)) for error in payload['errors'])
+            raise GitHubError(f"GraphQL query failed: {messages}", status=response.status_code, headers=response.headers)
+        return payload['data']
+
+TODO_ISSUES_QUERY = """
+query TodoIssues($owner: String!, $name: String!, $cursor: String, $first: Int!) {
+  repository(owner: $owner, name: $name) {
+    issues(first: $first, after: $cursor, labels: ["todo"]) {
+      pageInfo { hasNextPage endCursor }
+      nodes { id number title state body }
+    }
+  }
+}
+"""
+
+TODO_ISSUE_COUNT_QUERY = """
+query TodoIssueCount($owner: String!, $name: String!) {
+  repository(owner: $owner, name: $name) {
+    issues(labels: ["todo"]) { totalCount }
+  }
+}
+"""
+
+def fetch_todo_issues_graphql(client, repo_name):
+    """Page through every issue labelled `todo` with GraphQL, fetching only the needed fields"""
+    owner, name = repo_name.split('/', 1)
+    records = []
+    cursor = None
+    while True:
+        data = client.graphql(TODO_ISSUES_QUERY, {'owner': owner, 'name': name, 'cursor': cursor,
+                                                'first': ISSUE_PAGE_SIZE})
+        issues = data['repository']['issues']
+        for node in issues['nodes']:
+            records.append(IssueRecord(
+                number=node['number'],
+                title=node['title'],
+                state=node['state'].lower(),
+                body=node['body'],
+                node_id=node['id']
+            ))
+        if not issues['pageInfo']['hasNextPage']:
+            return records
+        cursor = issues['pageInfo']['endCursor']
+
+def fetch_todo_issues(client, repo_name, cache_path=DEFAULT_ISSUE_CACHE_FILE):
+    """Return every issue labelled `todo` as IssueRecords.
+
+    A conditional REST request for the most recently updated `todo` issue is sent
+    first with the ETag from the previous run. A 304 means no `todo` issue has
+    been updated, but unlabelling, deleting or transferring an issue leaves the
+    newest one untouched, so the cached records are reused only if a GraphQL
+    count of `todo` issues also still matches. Otherwise all issues are
+    re-fetched through GraphQL and the cache refreshed.
+    """
+    cache = {}
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    headers = {}
+    if cache.get('repo') == repo_name and cache.get('etag'):
+        headers['If-None-Match'] = cache['etag']
+
+    probe = client.request(
+        'GET', f"/repos/{repo_name}/issues",
+        expected=(200, 304),
+        params={'labels': 'todo', 'state': 'all', 'sort': 'updated', 'direction': 'desc', 'per_page': 1},
+        headers=headers
+    )
+    if probe.status_code == 304:
+        owner, name = repo_name.split('/', 1)
+        data = client.graphql(TODO_ISSUE_COUNT_QUERY, {'owner': owner, 'name': name})
+        if data['repository']['issues']['totalCount'] == len(cache['issues']):
+            print("Existing TODO issues unchanged since last run (using cache)")
+            return [IssueRecord(*issue) for issue in cache['issues']]
+        print("TODO issues were removed or unlabelled since last run. Refreshing the cache.")
+
+    records = fetch_todo_issues_graphql(client, repo_name)
+
+    cache_path = Path(cache_path)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(cache_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'repo': repo_name,
+            'etag': probe.headers.get('ETag'),
+            'issues': [list(record) for record in records]
+        }, f, separators=(',', ':'))
+    return records
+
+def issue_record_from_json(data):
+    """Build an IssueRecord from a REST issue payload"""
+    return IssueRecord(
+        number=data['number'],
+        title=data['title'],
+        state=data['state'],
+        body=data.get('body'),
+        node_id=data.get('node_id')
+    )
+
+def fetch_issue(client, repo_name, number):
+    """Fetch the current state of a single issue"""
+    return issue_record_from_json(client.request('GET', f"/repos/{repo_name}/issues/{number}").json())
+
+# The reference checklist lives between hidden markers so it can be found and
+# rewritten without touching anything else in the issue body
+REFS_HEADER = "### Related TODO References"
+REFS_START = "<!-- todo-refs:start -->"
+REFS_END = "<!-- todo-refs:end -->"
+REFS_PLACEHOLDER = "_No related references found yet. References will be added automatically when found._"
+REF_ENTRY_PATTERN = re.compile(r'^- \[([ xX])\] \[?`([^`]+:\d+)`(?:\]\([^)]*\))?(?: – (.*))?$')
+
+ReferenceEntry = namedtuple('ReferenceEntry', ['checked', 'description', 'line'])
+
+def reference_key(ref):
+    return f"{ref.file}:{ref.line}"
+
+def reference_sort_key(key):
+    """Order reference keys by file, then numerically by line"""
+    path, _, line = key.rpartition(':')
+    return (path, int(line))
+
+def reference_fingerprint(pairs):
+    """Stable hash of (key, description) pairs, used to detect reference changes without fetching"""
+    payload = json.dumps(sorted(pairs), separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+def split_reference_section(body):
+    """Split an issue body into (before, section, after) around the reference checklist.
+
+    Bodies written before the markers existed are split at the legacy
+    "Related TODO References" header; bodies without it get a new section appended.
+    """
+    body = body or ""
+    start = body.find(REFS_START)
+    end = body.find(REFS_END, start)
+    if start != -1 and end != -1:
+        return body[:start], body[start + len(REFS_START):end], body[end + len(REFS_END):]
+
+    header_at = body.find(REFS_HEADER)
+    if header_at == -1:
+        before = f"{body.rstrip()}\n\n{REFS_HEADER}\n" if body.strip() else f"{REFS_HEADER}\n"
+        return before, "", ""
+
+    line_end = body.find('\n', header_at)
+    if line_end == -1:
+        line_end = len(body)
+    section_end = body.find('\n###', line_end)
+    if section_end == -1:
+        section_end = len(body)
+    return body[:line_end] + '\n', body[line_end:section_end], body[section_end:]
+
+def parse_reference_section(body):
+    """Return {key: ReferenceEntry} for the reference checklist of an issue body"""
+    entries = {}
+    for line in split_reference_section(body)[1].split('\n'):
+        match = REF_ENTRY_PATTERN.match(line.strip())
+        if match:
+            entries[match.group(2)] = ReferenceEntry(
+                checked=match.group(1) != ' ',
+                description=match.group(3) or "",
+                line=line.strip()
+            )
+    return entries
+
+def render_reference_line(ref, repo_name, commit_sha, checked=False):
+    permalink = f"https://github.com/{repo_name}/blob/{commit_sha}/{ref.file}#L{ref.line}"
+    return f"- [{'x' if checked else ' '}] [`{reference_key(ref)}`]({permalink}) – {ref.description}"
+
+def update_reference_section(body, refs, repo_name, commit_sha):
+    """Rewrite the reference checklist of an issue body to match the current refs.
+
+    Entries whose location and description are unchanged keep their existing line
+    (and permalink, and checkbox), so the rendered body only changes when a
+    reference was added, removed or reworded. Returns (new_body, added, removed)
+    where added and removed are sets of `file:line` keys.
+    """
+    before, section, after = split_reference_section(body)
+    existing = parse_reference_section(body)
+    current = {reference_key(ref): ref for ref in refs}
+
+    lines = {}
+    for key, ref in current.items():
+        entry = existing.get(key)
+        if entry and entry.description == ref.description:
+            lines[key] = entry.line
+        else:
+            lines[key] = render_reference_line(ref, repo_name, commit_sha, checked=bool(entry and entry.checked))
+
+    rendered = '\n'.join(lines[key] for key in sorted(lines, key=reference_sort_key)) or REFS_PLACEHOLDER
+    new_body = f"{before}{REFS_START}\n{rendered}\n{REFS_END}{after}"
+    return new_body, set(current) - set(existing), set(existing) - set(current)
+
+def body_hash(body):
+    return hashlib.sha256((body or "").encode('utf-8')).hexdigest()
+
+def render_issue_body(todo, refs, repo_name, commit_sha):
+    """Render the body of a new issue for a canonical TODO, including its references"""
+    permalink = f"https://github.com/{repo_name}/blob/{commit_sha}/{todo.file}#L{todo.line}"
+
+    metadata_section = ""
+    if todo.metadata:
+        metadata_section = "\n### Metadata\n"
+        for key, value in todo.metadata.items():
+            metadata_section += f"- **{key}**: {value}\n"
+
+    body_content = textwrap.dedent(f"""
+        **TODO:** {todo.description}
+
+        **Location:** `{todo.file}:{todo.line}`  
+        **Permalink:** {permalink}  
+        **Commit:** {commit_sha[:7]}
+        {metadata_section}
+        ---
+
+        ### Code Context
+        ```
+        {todo.text}
+        ```
+
+        ---
+    """).strip()
+    return update_reference_section(body_content, refs, repo_name, commit_sha)[0]
+
+DEFAULT_STATE_FILE = '.todo-cache/issue-state.jsonl'
+STATE_VERSION = 2
+DEFAULT_FULL_RESYNC_DAYS = 7
+
+def load_issue_state(state_path, repo_name, max_age_days=DEFAULT_FULL_RESYNC_DAYS):
+    """Load the title -> issue state store.
+
+    The store is a JSON Lines file: a header line with the repository and the time
+    of the last full resync, then one line per TODO issue with its title, number,
+    state, node id and a fingerprint of its last-known references. Returns (entries, synced_at), or
+    None if the store is missing, belongs to another repository or is older than
+    max_age_days and a full resync is due.
+    """
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            if header.get('version') != STATE_VERSION or header.get('repo') != repo_name:
+                return None
+            if max_age_days and time.time() - header['synced_at'] > max_age_days * 86400:
+                print(f"Issue state store is older than {max_age_days} day(s). Running a full resync.")
+                return None
+
+            entries = {}
+            for line in f:
+                entry = json.loads(line)
+                entries[entry.pop('title')] = entry
+            return entries, header['synced_at']
+    except (OSError, ValueError, KeyError):
+        return None
+
+def save_issue_state(state_path, repo_name, entries, synced_at):
+    """Write the issue state store atomically"""
+    state_path = Path(state_path)
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = state_path.with_suffix(state_path.suffix + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'version': STATE_VERSION, 'repo': repo_name, 'synced_at': synced_at}) + '\n')
+        for title in sorted(entries):
+            f.write(json.dumps(dict(entries[title], title=title), separators=(',', ':')) + '\n')
+    os.replace(tmp_path, state_path)
+
+def state_entry(issue, refs_hash, file=None):
+    """Build a state store entry for an issue; file is where its canonical TODO was last seen"""
+    return {'number': issue.number, 'state': issue.state, 'node_id': issue.node_id, 'refs_hash': refs_hash,
+            'file': file}
+
+ISSUE_LOCATION_PATTERN = re.compile(r'^\*\*Location:\*\* `(.+):\d+`', re.MULTILINE)
+
+def issue_location_file(body):
+    """The file named on the Location line of an issue body, or None"""
+    match = ISSUE_LOCATION_PATTERN.search(body or '')
+    return match.group(1) if match else None
+
+DEFAULT_JOURNAL_FILE = '.todo-cache/sync-journal.jsonl'
+JOURNAL_VERSION = 1
+# 0 means no limit; a limit lets a first run over a large backlog create issues in batches
+DEFAULT_MAX_CREATES_PER_RUN = 0
+
+class SyncJournal:
+    """Write-ahead journal of the issue writes made by a sync.
+
+    Each operation is appended as 'planned' before its request is sent and as
+    'done', with its result, once it succeeds. A run that dies part-way leaves
+    the journal behind, and the next run skips what was already done. Keys are
+    (operation, subject, commit) tuples; duplicate-detection comments are keyed
+    without the commit and survive finish() so a comment is only posted once.
+    """
+
+    def __init__(self, path, repo_name):
+        self.path = Path(path)
+        self.repo_name = repo_name
+        self.lock = threading.Lock()
+        self.planned = set()
+        self.done = {}
+        self.file = None
+        self.valid = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline())
+                if header.get('version') != JOURNAL_VERSION or header.get('repo') != self.repo_name:
+                    return False
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # The last line of a killed run may be cut short
+                        break
+                    key = tuple(entry['key'])
+                    if entry['status'] == 'done':
+                        self.done[key] = entry.get('result')
+                    else:
+                        self.planned.add(key)
+            return True
+        except (OSError, ValueError, KeyError):
+            return False
+
+    @staticmethod
+    def key(operation, *parts):
+        return (operation, *map(str, parts))
+
+    def in_flight(self, operation):
+        """Keys of operations that were planned but never confirmed"""
+        return [key for key in self.planned if key[0] == operation and key not in self.done]
+
+    def completed(self, operation):
+        """(key, result) pairs of finished operations"""
+        return [(key, result) for key, result in self.done.items() if key[0] == operation]
+
+    def _append(self, entry):
+        with self.lock:
+            if self.file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self.file = open(self.path, 'a' if self.valid else 'w', encoding='utf-8')
+                if not self.valid:
+                    self.file.write(json.dumps({'version': JOURNAL_VERSION, 'repo': self.repo_name}) + '\n')
+                    self.valid = True
+            self.file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+            self.file.flush()
+
+    def plan(self, key):
+        self.planned.add(key)
+        self._append({'key': key, 'status': 'planned'})
+
+    def complete(self, key, result=None):
+        self.done[key] = result
+        self._append({'key': key, 'status': 'done', 'result': result})
+
+    def record(self, key, operation, *args, **kwargs):
+        """Run operation once for key and return its result, or the journaled result if it already ran"""
+        if key in self.done:
+            return self.done[key]
+        self.plan(key)
+        result = operation(*args, **kwargs)
+        self.complete(key, result)
+        return result
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+
+    def finish(self, keep=lambda key: False):
+        """Close out a completed sync, keeping the comment keys for which keep(key) is true"""
+        self.close()
+        with self.lock:
+            self.done = {key: result for key, result in self.done.items() if key[0] == 'comment' and keep(key)}
+            self.planned = set()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({'version': JOURNAL_VERSION, 'repo': self.repo_name}) + '\n')
+                for key, result in self.done.items():
+                    f.write(json.dumps({'key': key, 'status': 'done', 'result': result}, separators=(',', ':')) + '\n')
+            os.replace(tmp_path, self.path)
+            self.valid = True
+
+# GitHub asks integrators to keep content-creating requests under ~80 per minute
+DEFAULT_WRITE_RATE_PER_MINUTE = 80
+DEFAULT_WRITE_CONCURRENCY = 4
+WRITE_MAX_RETRIES = 5
+WRITE_MAX_BACKOFF = 60
+
+class WriteScheduler:
+    """Runs GitHub write calls on a bounded thread pool.
+
+    Every request takes a token from a token bucket refilled at the configured
+    rate, waits while the X-RateLimit-* headers say the primary limit is spent,
+    and is retried with jittered exponential backoff on 403/429 rate-limit
+    responses, 5xx errors and connection failures.
+    """
+
+    def __init__(self, client, max_workers=DEFAULT_WRITE_CONCURRENCY,
+                 rate_per_minute=DEFAULT_WRITE_RATE_PER_MINUTE, max_retries=WRITE_MAX_RETRIES):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.client = client
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(max_workers)
+        self.tokens = self.capacity
+        self.max_retries = max_retries
+        self.lock = threading.Lock()
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.started = time.monotonic()
+        self.calls = 0
+        self.retries = 0
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue a task that performs one or more requests; returns a Future"""
+        return self.executor.submit(fn, *args, **kwargs)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+    def acquire(self):
+        """Block until a token is available and no rate-limit pause is active"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                wait = self.paused_until - now
+                if wait <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Stop all workers from sending requests for the given number of seconds"""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def observe(self, headers):
+        """Pause until the reset time when the primary rate limit is exhausted"""
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset = headers.get('X-RateLimit-Reset')
+        if remaining is not None and reset is not None and int(remaining) <= 0:
+            self.pause(max(int(reset) - time.time(), 0) + 1)
+
+    def retry_delay(self, error, attempt):
+        """Seconds to wait before retrying a failed request, or None if it should not be retried"""
+        status = getattr(error, 'status', None)
+        headers = getattr(error, 'headers', {}) or {}
+
+        if status is not None and status not in (403, 429) and status < 500:
+            return None
+        if headers.get('Retry-After'):
+            return float(headers['Retry-After'])
+        if headers.get('X-RateLimit-Remaining') == '0' and headers.get('X-RateLimit-Reset'):
+            return max(int(headers['X-RateLimit-Reset']) - time.time(), 0) + 1
+        # A plain 403 is a permission problem, not a secondary rate limit
+        if status == 403 and 'rate limit' not in str(error).lower():
+            return None
+        return min(WRITE_MAX_BACKOFF, 2 ** attempt) * (0.5 + random.random())
+
+    def request(self, method, path, **kwargs):
+        """Send a throttled request through the client, retrying transient failures"""
+        from requests import RequestException
+
+        attempt = 0
+        while True:
+            self.acquire()
+            with self.lock:
+                self.calls += 1
+            try:
+                response = self.client.request(method, path, **kwargs)
+            except (GitHubError, RequestException) as e:
+                delay = self.retry_delay(e, attempt)
+                if delay is None or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                with self.lock:
+                    self.retries += 1
+                if getattr(self.client, 'metrics', None):
+                    self.client.metrics.record_retry(api_endpoint(method, path, kwargs.get('json')))
+                self.pause(delay)
+                continue
+            self.observe(response.headers)
+            return response
+
+    def summary(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return (f"{self.calls} write request(s) in {elapsed:.1f}s "
+                f"({self.calls / elapsed:.2f}/s), {self.retries} retried")
+
+DEFAULT_CLOSE_BATCH_SIZE = 25
+DEFAULT_MAX_CLOSES_PER_RUN = 50
+
+ISSUE_STATES_QUERY = """
+query TodoIssueStates($ids: [ID!]!) {
+  nodes(ids: $ids) { ... on Issue { id state } }
+}
+"""
+
+def auto_close_comment(commit_sha):
+    """The comment left on every issue closed because its TODO disappeared"""
+    return f"🤖 Auto-closed: TODO comment was removed from codebase in commit {commit_sha[:7]}"
+
+def build_close_mutation(count):
+    """Build one mutation that closes `count` issues using aliases"""
+    variables = [f'$id{i}: ID!' for i in range(count)]
+    fields = [f'c{i}: closeIssue(input: {{issueId: $id{i}}}) {{ issue {{ number }} }}' for i in range(count)]
+    return f"mutation CloseTodoIssues({', '.join(variables)}) {{\n  " + "\n  ".join(fields) + "\n}"
+
+def build_comment_mutation(count):
+    """Build one mutation that posts the same comment on `count` issues using aliases"""
+    variables = ['$body: String!'] + [f'$id{i}: ID!' for i in range(count)]
+    fields = [f'm{i}: addComment(input: {{subjectId: $id{i}, body: $body}}) {{ clientMutationId }}' for i in range(count)]
+    return f"mutation CommentTodoIssues({', '.join(variables)}) {{\n  " + "\n  ".join(fields) + "\n}"
+
+def graphql_errors(payload):
+    """Map each top-level alias of a GraphQL payload to its first error message"""
+    errors = {}
+    for error in payload.get('errors') or []:
+        alias = (error.get('path') or [''])[0]
+        errors.setdefault(alias, error.get('message', str(error)))
+    return errors
+
+def graphql_payload(scheduler, graphql_url, query, variables):
+    """POST a GraphQL document through the write scheduler and return the decoded payload"""
+    return scheduler.request('POST', graphql_url, json={'query': query, 'variables': variables}).json()
+
+def close_issue_batch(scheduler, graphql_url, issues, comment):
+    """Close a batch of issues with one aliased GraphQL mutation, then comment on those that closed.
+
+    Issues loaded from the state store (no body) are first re-checked in one
+    query so issues closed by hand are not closed again. The comment goes out
+    in a second mutation covering only the issues that actually closed, so an
+    issue that stays open never says it was auto-closed. Returns a dict mapping
+    issue number to None (closed), 'already closed', or an error message.
+    """
+    results = {}
+    unverified = [issue for issue in issues if issue.body is None]
+    if unverified:
+        payload = graphql_payload(scheduler, graphql_url, ISSUE_STATES_QUERY,
+                                  {'ids': [issue.node_id for issue in unverified]})
+        states = {node['id']: node['state'] for node in (payload.get('data') or {}).get('nodes') or [] if node}
+        for issue in unverified:
+            if states.get(issue.node_id, 'OPEN') != 'OPEN':
+                results[issue.number] = 'already closed'
+
+    batch = [issue for issue in issues if issue.number not in results]
+    if not batch:
+        return results
+
+    variables = {f'id{i}': issue.node_id for i, issue in enumerate(batch)}
+    payload = graphql_payload(scheduler, graphql_url, build_close_mutation(len(batch)), variables)
+    errors = graphql_errors(payload)
+    data = payload.get('data') or {}
+
+    closed = []
+    for i, issue in enumerate(batch):
+        if f'c{i}' in errors or not data.get(f'c{i}'):
+            results[issue.number] = errors.get(f'c{i}') or next(iter(errors.values()), 'close failed')
+        else:
+            closed.append(issue)
+    if not closed:
+        return results
+
+    variables = {'body': comment}
+    variables.update((f'id{i}', issue.node_id) for i, issue in enumerate(closed))
+    try:
+        payload = graphql_payload(scheduler, graphql_url, build_comment_mutation(len(closed)), variables)
+        errors = graphql_errors(payload)
+    except Exception as e:
+        payload, errors = {}, {'': str(e)}
+    data = payload.get('data') or {}
+
+    for i, issue in enumerate(closed):
+        if f'm{i}' in errors or f'm{i}' not in data:
+            error = errors.get(f'm{i}') or next(iter(errors.values()), 'no result')
+            results[issue.number] = f"closed, but comment failed: {error}"
+        else:
+            results[issue.number] = None
+    return results
+
+def git_head_blobs(paths):
+    """Return {path: bytes} for the HEAD version of each path with a single git cat-file call.
+
+    Paths that are not in HEAD are left out; outside a git repository the result is empty.
+    """
+    if not paths:
+        return {}
+    request = ''.join(f"HEAD:{Path(path).as_posix()}\n" for path in paths).encode('utf-8')
+    try:
+        result = subprocess.run(['git', 'cat-file', '--batch'], input=request, capture_output=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return {}
+
+    output = result.stdout
+    blobs = {}
+    pos = 0
+    for path in paths:
+        header_end = output.find(b'\n', pos)
+        if header_end == -1:
+            break
+        header = output[pos:header_end].split()
+        pos = header_end + 1
+        if len(header) == 3 and header[1] == b'blob':
+            size = int(header[2])
+            blobs[path] = output[pos:pos + size]
+            pos += size + 1
+    return blobs
+
+def staged_files():
+    """Paths added, copied, modified or renamed in the git index"""
+    output = run_git('diff', '--cached', '--name-only', '--diff-filter=ACMR', '-z')
+    return [path for path in (output or '').split('\0') if path]
+
+def filter_candidate_paths(paths, config):
+    """Keep the paths that the configured extension and directory filters would scan"""
+    exclude_dirs = set(config['exclude_directories'])
+    exclude_extensions = set(config['exclude_extensions'])
+    code_extensions = set(config['include_extensions'])
+
+    for path in paths:
+        parts = Path(path).parts
+        if (parts and is_candidate_name(parts[-1], code_extensions, exclude_extensions)
+                and exclude_dirs.isdisjoint(parts[:-1]) and os.path.isfile(path)):
+            yield path
+
+def marker_versions(marker_lines, keywords):
+    """Map (kind, title) to the set of (note, metadata) versions of well-formed markers"""
+    versions = defaultdict(set)
+    for _, _, marker in match_markers(marker_lines, keywords):
+        versions[(marker.kind, marker.title)].add(
+            (marker.description, tuple(sorted(marker.metadata.items())))
+        )
+    return versions
+
+def scan_command(argv):
+    """Check TODO markers in a set of files against HEAD without contacting GitHub.
+
+    Reports new, changed, removed and malformed markers and returns 1 if any
+    marker is malformed, so it can run as a pre-commit hook.
+    """
+    parser = argparse.ArgumentParser(
+        prog='todo_to_issues.py scan',
+        description='Check TODO markers in the given files without contacting GitHub'
+    )
+    parser.add_argument('files', nargs='*', help='Files to check (default: every candidate file)')
+    parser.add_argument('--staged', action='store_true', help='Check the files staged in git')
+    args = parser.parse_args(argv)
+
+    config = load_config()
+    if args.staged:
+        files = staged_files()
+    elif args.files:
+        files = args.files
+    else:
+        files = collect_candidate_files(config)
+    files = list(filter_candidate_paths(files, config))
+
+    keywords = marker_keywords(config)
+    max_file_size = config.get('max_file_size', DEFAULT_MAX_FILE_SIZE)
+    previous = git_head_blobs(files)
+    counts = Counter()
+
+    for file_path in files:
+        scanner = comment_scanner_for(file_path, config)
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                for line_num, line in enumerate(f, 1):
-                    canon_match = canonical_pattern.search(line)
-                    if canon_match:
-                        raw_title = canon_match.group(1).strip()
-                        metadata_str = canon_match.group(2)
-                        extra_desc = canon_match.group(3).strip() if canon_match.group(3) else ""
-                        
-                        metadata = parse_metadata(metadata_str)
-                        
-                        full_desc = raw_title
-                        if extra_desc:
-                            full_desc += f": {extra_desc}"
-
-                        if raw_title not in canonical_todos:
-                            canonical_todos[raw_title] = {
-                                'file': str(file_path),
-                                'line': line_num,
-                                'title': raw_title,
-                                'description': full_desc,
-                                'text': line.strip(),
-                                'metadata': metadata,
-                                'labels': extract_labels_from_metadata(metadata, config)
-                            }
-                        continue
-
-                    ref_match = referenced_pattern.search(line)
-                    if ref_match:
-                        raw_title = ref_match.group(1).strip()
-                        metadata_str = ref_match.group(2)
-                        extra_desc = ref_match.group(3).strip() if ref_match.group(3) else ""
-                        
-                        metadata = parse_metadata(metadata_str)
-                        
-                        referenced_todos[raw_title].append({
-                            'file': str(file_path),
-                            'line': line_num,
-                            'description': extra_desc if extra_desc else "Reference",
-                            'text': line.strip(),
-                            'metadata': metadata
-                        })
-                        continue
-
-        except (UnicodeDecodeError, PermissionError) as e:
-            if args.dry_run:
-                print(f"Warning: Could not read {file_path}: {e}")
+            marker_lines = read_marker_lines(file_path, max_file_size, scanner=scanner)
+        except (OSError, ValueError) as e:
+            print(f"{file_path}: could not be read: {e}")
             continue
 
+        before = marker_versions(find_marker_lines(previous.get(file_path, b''), scanner), keywords)
+        seen = set()
+        for line_num, line, comment in marker_lines:
+            problems = marker_problems(comment, keywords)
+            if problems:
+                counts['malformed'] += 1
+                for problem in problems:
+                    print(f"{file_path}:{line_num}: malformed TODO marker: {problem}")
+                continue
+
+            marker = parse_todo_marker(comment, keywords)
+            if marker is None:
+                # Another TODO(...) convention, e.g. TODO(alice): not ours to check
+                continue
+            key = (marker.kind, marker.title)
+            version = (marker.description, tuple(sorted(marker.metadata.items())))
+            seen.add(key)
+            if key not in before:
+                status = 'new'
+            elif version not in before[key]:
+                status = 'changed'
+            else:
+                continue
+            counts[status] += 1
+            print(f"{file_path}:{line_num}: {status} {marker.kind} TODO: {marker.title}")
+
+        for kind, title in sorted(set(before) - seen):
+            counts['removed'] += 1
+            print(f"{file_path}: removed {kind} TODO: {title}")
+
+    print(f"Checked {len(files)} file(s): {counts['new']} new, {counts['changed']} changed, "
+          f"{counts['removed']} removed, {counts['malformed']} malformed")
+    return 1 if counts['malformed'] else 0
+
+class LiveIndex:
+    """Canonical and reference TODOs of a working tree, kept up to date one file at a time"""
+
+    def __init__(self):
+        self.files = {}
+        self.canonical = Counter()
+        self.references = Counter()
+
+    def has_canonical(self, title):
+        return self.canonical[title] > 0
+
+    def orphans(self):
+        """Titles that are referenced but have no canonical TODO"""
+        return sorted(title for title, count in self.references.items() if count > 0 and not self.has_canonical(title))
+
+    def update(self, file_path, records):
+        """Replace the records of one file and return what changed.
+
+        Returns a list of (change, title, record) where change is 'new',
+        'changed' or 'removed' for canonical TODOs, 'orphaned' when a title is
+        referenced but has no canonical TODO any more (or gains a reference
+        while orphaned) and 'resolved' when an orphaned title gets one.
+        """
+        old = self.files.pop(file_path, [])
+        if records:
+            self.files[file_path] = records
+        titles = {record.title for record in old} | {record.title for record in records}
+        before = {title: (self.has_canonical(title), self.references[title] > 0) for title in titles}
+
+        for record in old:
+            (self.canonical if record.kind == 'canonical' else self.references)[record.title] -= 1
+        for record in records:
+            (self.canonical if record.kind == 'canonical' else self.references)[record.title] += 1
+
+        def versions(items, title, kind):
+            return [(r.note, r.metadata) for r in items if r.title == title and r.kind == kind]
+
+        changes = []
+        for title in sorted(titles):
+            had_canonical, had_refs = before[title]
+            has_canonical, has_refs = self.has_canonical(title), self.references[title] > 0
+            canonical = next((r for r in records if r.title == title and r.kind == 'canonical'), None)
+            reference = next((r for r in records if r.title == title and r.kind == 'reference'), None)
+
+            if has_canonical and not had_canonical:
+                changes.append(('new', title, canonical))
+            elif had_canonical and not has_canonical:
+                changes.append(('removed', title, None))
+            elif canonical and versions(old, title, 'canonical') != versions(records, title, 'canonical'):
+                changes.append(('changed', title, canonical))
+
+            if has_refs and not has_canonical:
+                new_refs = versions(records, title, 'reference') != versions(old, title, 'reference')
+                if had_canonical or not had_refs or (reference and new_refs):
+                    changes.append(('orphaned', title, reference))
+            elif had_refs and not had_canonical and has_canonical:
+                changes.append(('resolved', title, canonical))
+        return changes
+
+def format_change(change, title, record):
+    location = f" ({record.file}:{record.line})" if record else ""
+    return {
+        'new': f"+ new TODO: {title}{location}",
+        'changed': f"* changed TODO: {title}{location}",
+        'removed': f"- removed TODO: {title}",
+        'orphaned': f"! orphaned REF: {title}{location} has no canonical TODO",
+        'resolved': f"~ REF: {title} resolved by canonical TODO{location}"
+    }[change]
+
+class PollingWatcher:
+    """Reports changed candidate files by comparing stat results every interval"""
+
+    def __init__(self, config, file_source=None, interval=1.0):
+        self.config = config
+        self.file_source = file_source
+        self.interval = interval
+        self.snapshot = self.take_snapshot()
+
+    def take_snapshot(self):
+        snapshot = {}
+        for file_path in collect_candidate_files(self.config, source=self.file_source):
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            snapshot[file_path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def poll(self, timeout=None):
+        """Wait up to timeout seconds (forever if None) and return the set of changed paths"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            time.sleep(self.interval if deadline is None else max(0, min(self.interval, deadline - time.monotonic())))
+            current = self.take_snapshot()
+            changed = {path for path in current.keys() | self.snapshot.keys()
+                       if current.get(path) != self.snapshot.get(path)}
+            self.snapshot = current
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self):
+        pass
+
+class InotifyWatcher:
+    """Reports changed files under the working tree with Linux inotify, called through ctypes.
+
+    Every non-excluded directory gets a watch; directories created later are
+    watched as they appear. Raises OSError where inotify is unavailable.
+    """
+
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    IN_ISDIR = 0x40000000
+    IN_CLOEXEC = 0o2000000
+    WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT_HEADER = 16
+
+    def __init__(self, config, debounce=0.1):
+        import ctypes
+        import ctypes.util
+
+        try:
+            self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            init = self.libc.inotify_init1
+        except (OSError, AttributeError) as e:
+            raise OSError(f"inotify is not available: {e}")
+        self.fd = init(self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self.exclude_dirs = set(config['exclude_directories'])
+        self.debounce = debounce
+        self.dirs = {}
+        self.watch_tree('')
+
+    def watch_tree(self, rel_dir):
+        for dirpath, dirnames, _ in os.walk(rel_dir or '.'):
+            dirnames[:] = [d for d in dirnames if d not in self.exclude_dirs]
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), self.WATCH_MASK)
+            if wd >= 0:
+                self.dirs[wd] = '' if dirpath == '.' else os.path.normpath(dirpath)
+
+    def read_events(self):
+        import struct
+
+        changed = set()
+        data = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = struct.unpack_from('iIII', data, offset)
+            name = os.fsdecode(data[offset + self.EVENT_HEADER:offset + self.EVENT_HEADER + length].rstrip(b'\0'))
+            offset += self.EVENT_HEADER + length
+            if mask & self.IN_Q_OVERFLOW:
+                return None
+            if wd not in self.dirs or not name:
+                continue
+            path = os.path.join(self.dirs[wd], name) if self.dirs[wd] else name
+            if mask & self.IN_ISDIR:
+                if name in self.exclude_dirs:
+                    continue
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    self.watch_tree(path)
+            changed.add(path)
+        return changed
+
+    def poll(self, timeout=None):
+        """Wait up to timeout seconds (forever if None) and return the set of changed paths.
+
+        Events arriving within the debounce window are batched. Returns None if
+        the kernel queue overflowed and the tree must be rescanned.
+        """
+        import select
+
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+        changed = set()
+        while True:
+            events = self.read_events()
+            if events is None:
+                return None
+            changed |= events
+            if not select.select([self.fd], [], [], self.debounce)[0]:
+                return changed
+
+    def close(self):
+        os.close(self.fd)
+
+def watch_command(argv):
+    """Keep a live TODO index of the working tree and print changes as files are saved"""
+    parser = argparse.ArgumentParser(
+        prog='todo_to_issues.py watch',
+        description='Watch the working tree and print new, removed and orphaned TODOs as files change'
+    )
+    parser.add_argument('--poll', action='store_true', help='Poll file timestamps instead of using inotify')
+    parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls (default: 1.0)')
+    parser.add_argument('--jobs', type=int, default=None, help='Worker processes for the initial scan (default: CPU count)')
+    parser.add_argument('--file-source', choices=FILE_SOURCES, default=None, help='Where to list files from for the initial scan and polling')
+    args = parser.parse_args(argv)
+
+    config = load_config()
+    index = LiveIndex()
+
+    def rescan():
+        files = collect_candidate_files(config, source=args.file_source)
+        for file_path in set(index.files) - set(files):
+            index.update(file_path, [])
+        for file_path, (records, _, _) in iter_scan_results(files, config, jobs=args.jobs):
+            index.update(file_path, records)
+        return files
+
+    files = rescan()
+    print(f"Indexed {len(files)} file(s): {sum(1 for count in index.canonical.values() if count > 0)} canonical TODO(s), "
+          f"{sum(index.references.values())} reference(s)")
+    for title in index.orphans():
+        print(f"! orphaned REF: {title} has no canonical TODO")
+
+    watcher = None
+    if not args.poll:
+        try:
+            watcher = InotifyWatcher(config)
+            print("Watching for changes with inotify (Ctrl+C to stop)")
+        except OSError as e:
+            print(f"Falling back to polling: {e}")
+    if watcher is None:
+        watcher = PollingWatcher(config, file_source=args.file_source, interval=args.interval)
+        print(f"Polling for changes every {args.interval}s (Ctrl+C to stop)")
+
+    try:
+        while True:
+            changed = watcher.poll()
+            if changed is None:
+                print("Event queue overflowed; rescanning")
+                rescan()
+                continue
+
+            paths = set()
+            for path in changed:
+                if os.path.isdir(path):
+                    paths.update(list(walk_candidate_files(config, path)))
+                else:
+                    # A deleted or renamed directory takes every indexed file below it along
+                    prefix = path + os.sep
+                    paths.update(file_path for file_path in index.files if file_path.startswith(prefix))
+                    paths.add(path)
+
+            candidates = set(filter_candidate_paths(paths, config))
+            for file_path in sorted(paths):
+                if file_path not in candidates and file_path not in index.files:
+                    continue
+                records = scan_file(file_path, config)[0] if file_path in candidates else []
+                for change in index.update(sys.intern(file_path), records):
+                    print(format_change(*change))
+    except KeyboardInterrupt:
+        print("\nStopped watching")
+    finally:
+        watcher.close()
+    return 0
+
+def parse_shard(value):
+    """Parse an --shard value of the form i/N (1-based)"""
+    match = re.fullmatch(r'(\d+)/(\d+)', value)
+    if not match or not 1 <= int(match.group(1)) <= int(match.group(2)):
+        raise argparse.ArgumentTypeError(f"expected i/N with 1 <= i <= N, got '{value}'")
+    return int(match.group(1)), int(match.group(2))
+
+def shard_of(file_path, count):
+    """Stable 1-based shard number of a path, the same on every machine and run"""
+    return zlib.crc32(Path(file_path).as_posix().encode('utf-8')) % count + 1
+
+def add_sync_arguments(parser):
+    """Options shared by every command that talks to GitHub"""
+    parser.add_argument('--token', help='GitHub Token', required=False)
+    parser.add_argument('--repo', help='Repository Name (owner/repo)', required=False)
+    parser.add_argument('--sha', help='Commit SHA', required=False)
+    parser.add_argument('--api-url', help=f'GitHub API base URL (default: $GITHUB_API_URL or {DEFAULT_API_URL})', required=False)
+    parser.add_argument('--dry-run', action='store_true', help='Do not create issues, just print what would happen')
+    parser.add_argument('--state-file', default=DEFAULT_STATE_FILE, help=f'Path of the title -> issue state store (default: {DEFAULT_STATE_FILE})')
+    parser.add_argument('--full-resync', action='store_true', help='Rebuild the issue state store from the GitHub API instead of trusting it')
+    parser.add_argument('--journal-file', default=DEFAULT_JOURNAL_FILE, help=f'Path of the write-ahead journal used to resume interrupted syncs (default: {DEFAULT_JOURNAL_FILE})')
+    parser.add_argument('--metrics-json', help='Write per-phase timings, counters and API call statistics to this JSON file')
+    parser.add_argument('--profile', help='Write cProfile stats for the run to this file (use --jobs 1 to include scanning)')
+
+def resolve_credentials(args):
+    """Return (token, repo_name, commit_sha, api_url) from args or the environment"""
+    return (
+        args.token or os.environ.get('GITHUB_TOKEN'),
+        args.repo or os.environ.get('REPO_NAME'),
+        args.sha or os.environ.get('COMMIT_SHA') or 'unknown-sha',
+        args.api_url or os.environ.get('GITHUB_API_URL') or DEFAULT_API_URL
+    )
+
+def run_instrumented(args, body):
+    """Run body(args, metrics), then write the profile, metrics file and job summary"""
+    metrics = Metrics()
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        return body(args, metrics)
+    finally:
+        metrics.end_phase()
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(f"Wrote profile to {args.profile}")
+        if args.metrics_json:
+            metrics.write_json(args.metrics_json)
+            print(f"Wrote metrics to {args.metrics_json}")
+        summary_path = os.environ.get('GITHUB_STEP_SUMMARY')
+        if summary_path:
+            with open(summary_path, 'a', encoding='utf-8') as f:
+                f.write(metrics.job_summary())
+
+def sync_command(argv):
+    """Sync issues from results files written by an earlier scan"""
+    parser = argparse.ArgumentParser(
+        prog='todo_to_issues.py sync',
+        description='Sync issues from scan results written with --output'
+    )
+    parser.add_argument('--from', dest='results', action='append', required=True,
+                        help='Results file to sync from (repeat for every shard)')
+    add_sync_arguments(parser)
+    args = parser.parse_args(argv)
+    return run_instrumented(args, sync_from_results)
+
+def merge_and_sync_command(argv):
+    """Combine the results of --shard runs and sync issues once"""
+    parser = argparse.ArgumentParser(
+        prog='todo_to_issues.py merge-and-sync',
+        description='Merge shard scan results and run the issue sync once'
+    )
+    parser.add_argument('results', nargs='+', help='Shard result files written by --shard runs')
+    add_sync_arguments(parser)
+    args = parser.parse_args(argv)
+    return run_instrumented(args, sync_from_results)
+
+def sync_from_results(args, metrics):
+    token, repo_name, _, _ = resolve_credentials(args)
+    if not args.dry_run and (not token or not repo_name):
+        print("Error: GITHUB_TOKEN and REPO_NAME are required for non-dry-run mode")
+        return 1
+
+    metrics.start_phase('config')
+    config = load_config()
+
+    metrics.start_phase('load_results')
+    try:
+        commit_sha, canonical_todos, referenced_todos, scan_errors = load_scan_results(args.results, config)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error: could not load scan results: {e}")
+        return 1
+    print(f"Loaded scan results for commit {commit_sha} from {len(args.results)} file(s)")
+    # Permalinks point at the scanned commit unless one is given explicitly
+    if not args.sha and not os.environ.get('COMMIT_SHA'):
+        args.sha = commit_sha
+    return sync_todos(args, metrics, config, canonical_todos, referenced_todos, scan_errors)
+
+# Subcommands; running without one scans the repository and syncs issues
+COMMANDS = {
+    'scan': scan_command,
+    'watch': watch_command,
+    'sync': sync_command,
+    'merge-and-sync': merge_and_sync_command
+}
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+
+    parser = argparse.ArgumentParser(description='Convert TODOs to GitHub Issues')
+    add_sync_arguments(parser)
+    parser.add_argument('--jobs', type=int, default=None, help='Number of worker processes for scanning (default: CPU count)')
+    parser.add_argument('--file-source', choices=FILE_SOURCES, default=None, help='Where to list files from: git ls-files, a directory walk, or auto (default: file_source from config)')
+    parser.add_argument('--incremental', action='store_true', help='Only re-parse files changed since the last indexed commit')
+    parser.add_argument('--index-file', default=DEFAULT_INDEX_FILE, help=f'Path of the persisted TODO index (default: {DEFAULT_INDEX_FILE})')
+    parser.add_argument('--blame', action='store_true', help='Add git blame author, commit and age to each TODO (same as blame: true in the config)')
+    parser.add_argument('--output', help='Also write the scan results to this file (JSON Lines, gzip-compressed if it ends in .gz)')
+    parser.add_argument('--scan-only', action='store_true', help='Stop after scanning; sync later with `sync --from`')
+    parser.add_argument('--shard', type=parse_shard, help='Scan only shard i of N (e.g. 2/4); implies --scan-only (default output: .todo-cache/shard-i-of-N.jsonl)')
+    args = parser.parse_args(argv)
+    return run_instrumented(args, run)
+
+def run(args, metrics):
+    """Scan the repository and sync TODO issues, recording timings in metrics"""
+    token, repo_name, commit_sha, _ = resolve_credentials(args)
+
+    scan_only = args.scan_only or args.shard
+    if not args.dry_run and not scan_only and (not token or not repo_name):
+        print("Error: GITHUB_TOKEN and REPO_NAME are required for non-dry-run mode")
+        return
+
+    metrics.start_phase('config')
+    config = load_config()
+
+    print("=" * 80)
+    print("SCANNING REPOSITORY FOR TODOs")
+    print("=" * 80)
+
+    metrics.start_phase('walk')
+    files = collect_candidate_files(config, source=args.file_source)
+    if args.shard:
+        files = [file_path for file_path in files if shard_of(file_path, args.shard[1]) == args.shard[0]]
+        print(f"Shard {args.shard[0]}/{args.shard[1]}: {len(files)} file(s)")
+    metrics.count('files_listed', len(files))
+
+    metrics.start_phase('scan')
+    if args.incremental:
+        results = incremental_scan_results(
+            files, config, args.index_file, commit_sha, jobs=args.jobs, stats=metrics.counters
+        )
+    else:
+        results = record_scan_stats(metrics.counters, iter_scan_results(files, config, jobs=args.jobs))
+    if args.blame or config.get('blame'):
+        results = blame_enriched_results(results, config, stats=metrics.counters)
+
+    output = args.output
+    if args.shard and not output:
+        output = f".todo-cache/shard-{args.shard[0]}-of-{args.shard[1]}.jsonl"
+    if output:
+        results = stream_results(output, results, config, resolve_commit(commit_sha) or commit_sha, args.shard)
+
+    if scan_only:
+        for _ in results:
+            pass
+        if metrics.counters['files_skipped']:
+            print(f"Skipped {metrics.counters['files_skipped']} binary, oversized or unreadable file(s)")
+        if output:
+            print(f"Wrote scan results to {output}")
+        return
+
+    canonical_todos, referenced_todos, scan_errors = merge_scan_results(results)
+    if output:
+        print(f"Wrote scan results to {output}")
+    return sync_todos(args, metrics, config, canonical_todos, referenced_todos, scan_errors)
+
+def sync_todos(args, metrics, config, canonical_todos, referenced_todos, scan_errors):
+    """Create, close and update issues so they match the scanned TODOs"""
+    token, repo_name, commit_sha, api_url = resolve_credentials(args)
+
+    # Initialize GitHub client if not dry run
+    client = None
+    if not args.dry_run:
+        client = GitHubClient(token, api_url, metrics=metrics,
+                              timeout=config.get('request_timeout', DEFAULT_REQUEST_TIMEOUT))
+
+    metrics.count('canonical_todos', len(canonical_todos))
+    metrics.count('referenced_todos', sum(len(v) for v in referenced_todos.values()))
+
+    for file_path, error in scan_errors:
+        print(f"Warning: Could not read {file_path}: {error}")
+    metrics.count('files_with_errors', len(scan_errors))
+
     print(f"\nFound {len(canonical_todos)} canonical TODO titles")
     print(f"Found {sum(len(v) for v in referenced_todos.values())} referenced TODOs")
 
     if args.dry_run:
         print("\n[DRY RUN] Skipping Issue Check and Creation")
         print("\nWOULD CREATE ISSUES FOR:")
+        metrics.start_phase('duplicate_checks')
+        duplicate_index = DuplicateIndex()
         for title in canonical_todos:
-            print(f" - {title}")
+            duplicate_title = duplicate_index.find(title, threshold=config['duplicate_threshold'])
+            if duplicate_title:
+                print(f" - {title} (potential duplicate of '{duplicate_title}')")
+            else:
+                print(f" - {title}")
+            duplicate_index.add(title)
         return
 
     # Get existing issues with 'todo' label
     print("\n" + "=" * 80)
     print("CHECKING EXISTING ISSUES")
     print("=" * 80)
+    metrics.start_phase('fetch_issues')
     
     existing_issues_map = {}
-    try:
-        for issue in repo.get_issues(state='all', labels=['todo']):
-            if issue.title.startswith("TODO: "):
-                extracted_title = issue.title[6:].strip()
-                existing_issues_map[extracted_title] = issue
-        
-        print(f"Found {len(existing_issues_map)} existing TODO issues")
-    except Exception as e:
-        print(f"Error fetching existing issues: {e}")
+    state = None
+    journal = SyncJournal(args.journal_file, repo_name)
+    if journal.in_flight('create'):
+        # A create may have gone through without being confirmed; only a listing can tell
+        print("The previous sync stopped while creating issues. Listing issues from GitHub to pick up where it left off.")
+    elif not args.full_resync:
+        state = load_issue_state(
+            args.state_file, repo_name, config.get('full_resync_days', DEFAULT_FULL_RESYNC_DAYS)
+        )
+
+    if state:
+        # Bodies are not stored; they are fetched only for issues about to change
+        issue_state, synced_at = state
+        for title, entry in issue_state.items():
+            existing_issues_map[title] = IssueRecord(
+                entry['number'], f"TODO: {title}", entry['state'], None, entry.get('node_id')
+            )
+        print(f"Loaded {len(existing_issues_map)} TODO issues from {args.state_file}")
+    else:
+        issue_state, synced_at = {}, time.time()
+        try:
+            for issue in fetch_todo_issues(client, repo_name):
+                if issue.title.startswith("TODO: "):
+                    extracted_title = issue.title[6:].strip()
+                    existing_issues_map[extracted_title] = issue
+                    entries = parse_reference_section(issue.body)
+                    issue_state[extracted_title] = state_entry(issue, reference_fingerprint(
+                        (key, entry.description) for key, entry in entries.items()
+                    ), issue_location_file(issue.body))
+
+            print(f"Found {len(existing_issues_map)} existing TODO issues")
+        except Exception as e:
+            print(f"Error fetching existing issues: {e}")
+            # Never persist a partial listing as the source of truth
+            synced_at = None
+
+    resumed = 0
+    for (_, title, _), result in journal.completed('create'):
+        if title not in existing_issues_map:
+            issue = IssueRecord(result['number'], f"TODO: {title}", 'open', None, result['node_id'])
+            existing_issues_map[title] = issue
+            # Unknown references: the cross-reference pass re-reads the body
+            issue_state[title] = state_entry(issue, None)
+            resumed += 1
+    if resumed:
+        print(f"Recovered {resumed} issue(s) created by an interrupted sync from {args.journal_file}")
+
+    scheduler = WriteScheduler(
+        client,
+        max_workers=config.get('write_concurrency', DEFAULT_WRITE_CONCURRENCY),
+        rate_per_minute=config.get('write_rate_per_minute', DEFAULT_WRITE_RATE_PER_MINUTE)
+    )
+
+    def issue_path(number, suffix=''):
+        return f"/repos/{repo_name}/issues/{number}{suffix}"
+
+    # Remember where each canonical TODO lives, so a later skipped file can protect its issue
+    for title_key, todo in canonical_todos.items():
+        if title_key in issue_state:
+            issue_state[title_key]['file'] = todo.file
 
     # AUTO-CLOSE: Close issues for TODOs that no longer exist
     print("\n" + "=" * 80)
     print("AUTO-CLOSING REMOVED TODOs")
     print("=" * 80)
+    metrics.start_phase('auto_close')
 
     closed_count = 0
     if config['auto_close']:
         current_todo_titles = set(canonical_todos.keys())
-        
-        for existing_title, issue in existing_issues_map.items():
-            if issue.state == 'open' and existing_title not in current_todo_titles:
+        # A TODO in a file that could not be scanned only looks removed
+        unscanned = {Path(file_path).as_posix() for file_path, _ in scan_errors}
+
+        def todo_file(title, issue):
+            file = issue_state.get(title, {}).get('file') or issue_location_file(issue.body)
+            if file is None and issue.body is None:
                 try:
-                    issue.edit(state='closed')
-                    issue.create_comment(
-                        f"🤖 Auto-closed: TODO comment was removed from codebase in commit {commit_sha[:7]}"
-                    )
+                    file = issue_location_file(fetch_issue(client, repo_name, issue.number).body)
+                except Exception as e:
+                    print(f"\nCould not read issue #{issue.number} to find its TODO: {e}")
+                    return None
+            return file
+
+        stale = []
+        for existing_title, issue in existing_issues_map.items():
+            if issue.state != 'open' or existing_title in current_todo_titles:
+                continue
+            if journal.key('close', issue.number, commit_sha) in journal.done:
+                print(f"\nIssue #{issue.number} ('{existing_title}') was closed by an interrupted sync")
+                if existing_title in issue_state:
+                    issue_state[existing_title]['state'] = 'closed'
+                continue
+            if unscanned:
+                file = todo_file(existing_title, issue)
+                if file is None or Path(file).as_posix() in unscanned:
+                    print(f"\nNot closing issue #{issue.number} ('{existing_title}'): "
+                          f"{file or 'its file'} was not scanned")
+                    continue
+            stale.append((existing_title, issue))
+
+        max_closes = config.get('max_closes_per_run', DEFAULT_MAX_CLOSES_PER_RUN)
+        if max_closes and len(stale) > max_closes:
+            print(f"Refusing to close {len(stale)} issues: more than max_closes_per_run ({max_closes}).")
+            print("This usually means the scan missed files. Raise the limit in todo-config.yml if this is intended.")
+            stale = []
+
+        batch_size = config.get('close_batch_size', DEFAULT_CLOSE_BATCH_SIZE)
+        comment = auto_close_comment(commit_sha)
+        batches = []
+        for i in range(0, len(stale), batch_size):
+            batch = stale[i:i + batch_size]
+            for _, issue in batch:
+                journal.plan(journal.key('close', issue.number, commit_sha))
+            future = scheduler.submit(
+                close_issue_batch, scheduler, client.graphql_url, [issue for _, issue in batch], comment
+            )
+            batches.append((batch, future))
+
+        for batch, future in batches:
+            try:
+                results = future.result()
+            except Exception as e:
+                results = {issue.number: str(e) for _, issue in batch}
+
+            for existing_title, issue in batch:
+                result = results.get(issue.number, 'no result')
+                if result == 'already closed':
+                    print(f"\nIssue #{issue.number} ('{existing_title}') is already closed")
+                elif result is None or result.startswith('closed, but'):
                     print(f"\nClosed issue #{issue.number}: '{existing_title}' (TODO removed from code)")
+                    if result:
+                        print(f"   Warning: {result}")
                     closed_count += 1
-                except Exception as e:
-                    print(f"\nError closing issue #{issue.number}: {e}")
+                else:
+                    print(f"\nError closing issue #{issue.number}: {result}")
+                    continue
+                journal.complete(journal.key('close', issue.number, commit_sha))
+                if existing_title in issue_state:
+                    issue_state[existing_title]['state'] = 'closed'
     else:
         print("Auto-close is disabled in configuration")
 
@@ -269,168 +2682,216 @@ def main():
     print("\n" + "=" * 80)
     print("CREATING ISSUES FOR CANONICAL TODOs")
     print("=" * 80)
+    metrics.start_phase('create')
+
+    def assign_issue(number, title_key, assignee, commit):
+        def post():
+            scheduler.request('POST', issue_path(number, '/assignees'), json={'assignees': [assignee]})
+        journal.record(journal.key('assign', title_key, commit), post)
+
+    def create_issue(title_key, todo):
+        body_content = render_issue_body(todo, referenced_todos.get(title_key, []), repo_name, commit_sha)
+
+        key = journal.key('create', title_key, commit_sha)
+        journal.plan(key)
+        response = scheduler.request('POST', f"/repos/{repo_name}/issues", json={
+            'title': f"TODO: {title_key}",
+            'body': body_content,
+            'labels': todo.labels(config)
+        })
+        issue = issue_record_from_json(response.json())
+        journal.complete(key, {'number': issue.number, 'node_id': issue.node_id})
+
+        assign_error = None
+        if 'ASSIGNEE' in todo.metadata:
+            try:
+                assign_issue(issue.number, title_key, todo.metadata['ASSIGNEE'], commit_sha)
+            except Exception as e:
+                assign_error = e
+        return issue, assign_error
+
+    def comment_duplicate(number, title_key, todo):
+        permalink = f"https://github.com/{repo_name}/blob/{commit_sha}/{todo.file}#L{todo.line}"
+
+        def post():
+            scheduler.request('POST', issue_path(number, '/comments'), json={
+                'body': (
+                    f"🔍 Potential duplicate TODO found:\n\n"
+                    f"**Title:** {title_key}\n"
+                    f"**Location:** [`{todo.file}:{todo.line}`]({permalink})\n\n"
+                    f"This may be a duplicate or related TODO. Please review."
+                )
+            })
+        # Keyed without the commit: the same duplicate is reported once, not on every run
+        journal.record(journal.key('comment', number, title_key), post)
+
+    def patch_body(number, body, key):
+        def patch():
+            scheduler.request('PATCH', issue_path(number), json={'body': body})
+        journal.record(key, patch)
 
     created_count = 0
     duplicate_count = 0
-    
+    duplicate_index = DuplicateIndex(existing_issues_map.keys())
+    creates = []
+    duplicate_comments = []
+    max_creates = config.get('max_creates_per_run', DEFAULT_MAX_CREATES_PER_RUN)
+    deferred_count = 0
+
+    # Finish assignments an interrupted sync did not get to
+    assignments = []
+    for (_, title_key, created_at), result in journal.completed('create'):
+        todo = canonical_todos.get(title_key)
+        if todo and 'ASSIGNEE' in todo.metadata and journal.key('assign', title_key, created_at) not in journal.done:
+            assignee = todo.metadata['ASSIGNEE']
+            assignments.append((result['number'], assignee, scheduler.submit(
+                assign_issue, result['number'], title_key, assignee, created_at
+            )))
+    for number, assignee, future in assignments:
+        try:
+            future.result()
+            print(f"\nAssigned issue #{number} to {assignee}")
+        except Exception as e:
+            print(f"\nCould not assign issue #{number} to {assignee}: {e}")
+
     for title_key, todo in canonical_todos.items():
         if title_key in existing_issues_map:
             print(f"\nSkipping (already exists): {title_key[:60]}...")
             continue
 
-        duplicate_title = find_duplicate(
-            title_key, 
-            existing_issues_map.keys(), 
-            threshold=config['duplicate_threshold']
-        )
-        
+        with metrics.phase('duplicate_checks'):
+            duplicate_title = duplicate_index.find(title_key, threshold=config['duplicate_threshold'])
+
         if duplicate_title:
             print(f"\nPotential duplicate detected:")
             print(f"  New: '{title_key}'")
             print(f"  Existing: '{duplicate_title}'")
             print(f"  Similarity: {similarity_ratio(title_key, duplicate_title):.2%}")
-            
-            try:
-                existing_issue = existing_issues_map[duplicate_title]
-                permalink = f"https://github.com/{repo_name}/blob/{commit_sha}/{todo['file']}#L{todo['line']}"
-                existing_issue.create_comment(
-                    f"🔍 Potential duplicate TODO found:\n\n"
-                    f"**Title:** {title_key}\n"
-                    f"**Location:** [`{todo['file']}:{todo['line']}`]({permalink})\n\n"
-                    f"This may be a duplicate or related TODO. Please review."
-                )
-            except Exception as e:
-                print(f"  Could not add comment to existing issue: {e}")
-            
+            # The duplicate may be an issue created earlier in this run, so comment once creation finishes
+            duplicate_comments.append((duplicate_title, title_key, todo))
             duplicate_count += 1
             continue
 
+        if max_creates and len(creates) >= max_creates:
+            deferred_count += 1
+            continue
+
+        creates.append((title_key, todo, scheduler.submit(create_issue, title_key, todo)))
+        duplicate_index.add(title_key)
+
+    for title_key, todo, future in creates:
         try:
-            permalink = f"https://github.com/{repo_name}/blob/{commit_sha}/{todo['file']}#L{todo['line']}"
-
-            metadata_section = ""
-            if todo['metadata']:
-                metadata_section = "\n### Metadata\n"
-                for key, value in todo['metadata'].items():
-                    metadata_section += f"- **{key}**: {value}\n"
-
-            body_content = textwrap.dedent(f"""
-                **TODO:** {todo['description']}
-
-                **Location:** `{todo['file']}:{todo['line']}`  
-                **Permalink:** {permalink}  
-                **Commit:** {commit_sha[:7]}
-                {metadata_section}
-                ---
-
-                ### Code Context
-                ```
-                {todo['text']}
-                ```
-
-                ---
-
-                ### Related TODO References
-                _No related references found yet. References will be added automatically when found._
-            """).strip()
-
-            issue = repo.create_issue(
-                title=f"TODO: {title_key}",
-                body=body_content,
-                labels=todo['labels']
-            )
+            issue, assign_error = future.result()
+        except Exception as e:
+            print(f"\nError creating issue for '{title_key}': {e}")
+            continue
 
-            if 'ASSIGNEE' in todo['metadata']:
-                try:
-                    assignee = todo['metadata']['ASSIGNEE']
-                    issue.add_to_assignees(assignee)
-                    print(f"   Assigned to: {assignee}")
-                except Exception as e:
-                    print(f"   Could not assign to {assignee}: {e}")
+        if 'ASSIGNEE' in todo.metadata:
+            assignee = todo.metadata['ASSIGNEE']
+            if assign_error:
+                print(f"   Could not assign to {assignee}: {assign_error}")
+            else:
+                print(f"   Assigned to: {assignee}")
+
+        print(f"\nCreated issue #{issue.number}: {title_key}")
+        print(f"   Labels: {', '.join(todo.labels(config))}")
+        created_count += 1
+        existing_issues_map[title_key] = issue
+        issue_state[title_key] = state_entry(issue, reference_fingerprint(
+            (reference_key(ref), ref.description) for ref in referenced_todos.get(title_key, [])
+        ), todo.file)
 
-            print(f"\nCreated issue #{issue.number}: {title_key}")
-            print(f"   Labels: {', '.join(todo['labels'])}")
-            created_count += 1
-            existing_issues_map[title_key] = issue
+    comments = []
+    for duplicate_title, title_key, todo in duplicate_comments:
+        if duplicate_title not in existing_issues_map:
+            print(f"\nCould not comment on '{duplicate_title}': its issue was not created")
+            continue
+        number = existing_issues_map[duplicate_title].number
+        comments.append((number, scheduler.submit(comment_duplicate, number, title_key, todo)))
 
+    for number, future in comments:
+        try:
+            future.result()
         except Exception as e:
-            print(f"\nError creating issue for '{title_key}': {e}")
+            print(f"  Could not add comment to existing issue #{number}: {e}")
 
     print(f"\nCreated {created_count} new issues")
+    if deferred_count:
+        print(f"Deferred {deferred_count} new issue(s) to the next run (max_creates_per_run: {max_creates})")
     print(f"Skipped {duplicate_count} potential duplicates")
 
     # Update issues with referenced TODOs
     print("\n" + "=" * 80)
     print("UPDATING ISSUES WITH CROSS-REFERENCES")
     print("=" * 80)
+    metrics.start_phase('cross_reference')
 
     updated_count = 0
-    all_titles_with_refs = set(referenced_todos.keys())
-    
-    for title_key in all_titles_with_refs:
+    edits = []
+    empty_fingerprint = reference_fingerprint([])
+    # Open issues that had references may need stale ones removed even if none remain
+    titles_to_check = set(referenced_todos.keys()) | {
+        title for title, entry in issue_state.items()
+        if entry.get('refs_hash') != empty_fingerprint and entry['state'] == 'open'
+    }
+
+    for title_key in sorted(titles_to_check):
+        refs = referenced_todos.get(title_key, [])
         if title_key not in existing_issues_map:
-            print(f"\nFound {len(referenced_todos[title_key])} reference(s) for '{title_key}' but no canonical TODO or existing issue. Skipping.")
+            print(f"\nFound {len(refs)} reference(s) for '{title_key}' but no canonical TODO or existing issue. Skipping.")
             continue
-        
+
         issue = existing_issues_map[title_key]
-        refs = referenced_todos[title_key]
+        fingerprint = reference_fingerprint((reference_key(ref), ref.description) for ref in refs)
+        edit_key = journal.key('edit', issue.number, fingerprint)
+        if issue_state.get(title_key, {}).get('refs_hash') == fingerprint or edit_key in journal.done:
+            print(f"\nIssue #{issue.number} references are up to date for '{title_key}'")
+            if title_key in issue_state:
+                issue_state[title_key]['refs_hash'] = fingerprint
+            continue
 
         try:
-            existing_refs_in_body = set()
-            if issue.body:
-                for line in issue.body.split('\n'):
-                    if line.strip().startswith('- [ ]') and '`' in line:
-                        match = re.search(r'`([^`]+:\d+)`', line)
-                        if match:
-                            existing_refs_in_body.add(match.group(1))
-
-            new_refs_lines = []
-            for ref in refs:
-                ref_key = f"{ref['file']}:{ref['line']}"
-                if ref_key not in existing_refs_in_body:
-                    permalink = f"https://github.com/{repo_name}/blob/{commit_sha}/{ref['file']}#L{ref['line']}"
-                    new_refs_lines.append(f"- [ ] [`{ref_key}`]({permalink}) – {ref['description']}")
-
-            if new_refs_lines:
-                new_body = issue.body or ""
-                header = "### Related TODO References"
-                
-                if header not in new_body:
-                    new_body += f"\n\n{header}\n" + "\n".join(new_refs_lines)
-                else:
-                    lines = new_body.split('\n')
-                    header_idx = None
-                    for i, line in enumerate(lines):
-                        if header in line:
-                            header_idx = i
-                            break
-                    
-                    if header_idx is not None:
-                        section_end = len(lines)
-                        for i in range(header_idx + 1, len(lines)):
-                            if lines[i].startswith('###'):
-                                section_end = i
-                                break
-                        
-                        before = '\n'.join(lines[:header_idx + 1])
-                        existing_refs = '\n'.join(lines[header_idx + 1:section_end])
-                        after = '\n'.join(lines[section_end:]) if section_end < len(lines) else ""
-                        
-                        new_body = before + '\n' + existing_refs + '\n' + '\n'.join(new_refs_lines)
-                        if after:
-                            new_body += '\n' + after
-                
-                issue.edit(body=new_body)
-                print(f"\nUpdated issue #{issue.number} ('{title_key}') with {len(new_refs_lines)} new reference(s)")
-                updated_count += 1
-            else:
-                print(f"\nIssue #{issue.number} already has all references for '{title_key}'")
+            if issue.body is None:
+                issue = fetch_issue(client, repo_name, issue.number)
+                existing_issues_map[title_key] = issue
 
+            new_body, added, removed = update_reference_section(issue.body, refs, repo_name, commit_sha)
+            if body_hash(new_body) == body_hash(issue.body):
+                print(f"\nIssue #{issue.number} references are up to date for '{title_key}'")
+                if title_key in issue_state:
+                    issue_state[title_key]['refs_hash'] = fingerprint
+                continue
+
+            future = scheduler.submit(patch_body, issue.number, new_body, edit_key)
+            edits.append((title_key, issue, added, removed, fingerprint, future))
+
+        except Exception as e:
+            print(f"\nError updating issue #{issue.number}: {e}")
+
+    for title_key, issue, added, removed, fingerprint, future in edits:
+        try:
+            future.result()
+            print(f"\nUpdated issue #{issue.number} ('{title_key}'): "
+                  f"{len(added)} reference(s) added, {len(removed)} removed")
+            updated_count += 1
+            if title_key in issue_state:
+                issue_state[title_key]['refs_hash'] = fingerprint
         except Exception as e:
             print(f"\nError updating issue #{issue.number}: {e}")
 
+    scheduler.shutdown()
+    journal.close()
+    if synced_at is not None:
+        save_issue_state(args.state_file, repo_name, issue_state, synced_at)
+        # Everything is in the state store now; keep only the comments for duplicates still in the code
+        journal.finish(keep=lambda key: key[2] in canonical_todos)
     print(f"\nUpdated {updated_count} issue(s) with cross-references")
-    
+    metrics.end_phase()
+    metrics.count('issues_created', created_count)
+    metrics.count('issues_updated', updated_count)
+    metrics.count('issues_closed', closed_count)
+    metrics.count('duplicates_skipped', duplicate_count)
+
     print("\n" + "=" * 80)
     print("SUMMARY")
     print("=" * 80)
@@ -439,7 +2900,8 @@ def main():
     print(f"Issues updated: {updated_count}")
     print(f"Issues closed: {closed_count}")
     print(f"Duplicates skipped: {duplicate_count}")
+    print(f"API throughput: {scheduler.summary()}")
     print("=" * 80)
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
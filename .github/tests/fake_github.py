@@ -0,0 +1,330 @@
+"""
+In-process stand-in for the parts of the GitHub API used by todo_to_issues.py.
+
+Serves the issues REST endpoints and the GraphQL operations the tool sends, with
+configurable latency, page size, rate-limit headers and injected errors. Use it
+from tests as a context manager, or run it standalone for load testing:
+
+    python3 .github/tests/fake_github.py --port 8765 --latency 0.05
+    python3 .github/scripts/todo_to_issues.py --api-url http://127.0.0.1:8765 --token x --repo owner/repo
+"""
+
+import re
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CLOSE_PATTERN = re.compile(r'(\w+): closeIssue\(input: \{issueId: \$(\w+)\}\)')
+COMMENT_PATTERN = re.compile(r'(\w+): addComment\(input: \{subjectId: \$(\w+), body: \$(\w+)\}\)')
+
+class FakeGitHub:
+    """A fake GitHub API server holding issues in memory.
+
+    latency: seconds to sleep before answering each request
+    page_size: maximum issues per REST or GraphQL page
+    rate_limit: requests allowed before X-RateLimit-Remaining hits zero and 403s start
+    error_rate: probability of answering any request with a 502
+    """
+
+    def __init__(self, latency=0.0, page_size=100, rate_limit=5000, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.page_size = page_size
+        self.rate_limit = rate_limit
+        self.remaining = rate_limit
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.issues = {}
+        self.next_number = 1
+        self.clock = 0
+        self.requests = []
+        self.injected = []
+        self.mutation_count = 0
+        self.server = None
+        self.thread = None
+
+    # -- lifecycle -----------------------------------------------------------
+
+    def start(self, port=0):
+        handler = type('Handler', (FakeGitHubHandler,), {'fake': self})
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # -- test helpers --------------------------------------------------------
+
+    def add_issue(self, title, body="", state='open', labels=('todo',)):
+        """Seed an issue and return its number"""
+        with self.lock:
+            return self._create(title, body, list(labels), state=state)['number']
+
+    def inject_error(self, status, count=1, headers=None, method=None):
+        """Answer the next `count` requests (optionally only for one method) with `status`"""
+        with self.lock:
+            self.injected.extend([(status, headers or {}, method)] * count)
+
+    def write_count(self):
+        """Number of REST writes plus GraphQL mutations received"""
+        rest_writes = sum(1 for method, path in self.requests
+                          if method in ('POST', 'PATCH') and not path.endswith('/graphql'))
+        return rest_writes + self.mutation_count
+
+    # -- state ---------------------------------------------------------------
+
+    def _tick(self):
+        self.clock += 1
+        return self.clock
+
+    def _create(self, title, body, labels, state='open'):
+        number = self.next_number
+        self.next_number += 1
+        issue = {
+            'number': number,
+            'node_id': f"I_{number}",
+            'title': title,
+            'body': body,
+            'state': state,
+            'labels': [{'name': label} for label in labels],
+            'assignees': [],
+            'comments': [],
+            'updated': self._tick()
+        }
+        self.issues[number] = issue
+        return issue
+
+    def _public(self, issue):
+        return {key: value for key, value in issue.items() if key not in ('comments', 'updated')}
+
+    def _by_node_id(self, node_id):
+        for issue in self.issues.values():
+            if issue['node_id'] == node_id:
+                return issue
+        return None
+
+    # -- request handling ----------------------------------------------------
+
+    def handle(self, method, path, query, headers, payload):
+        """Return (status, headers, body) for a request"""
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self.lock:
+            self.requests.append((method, path))
+
+            for i, (status, extra, only_method) in enumerate(self.injected):
+                if only_method is None or only_method == method:
+                    del self.injected[i]
+                    return status, extra, {'message': f'injected {status}'}
+
+            if self.error_rate and self.random.random() < self.error_rate:
+                return 502, {}, {'message': 'injected server error'}
+
+            if self.remaining <= 0:
+                return 403, self._rate_headers(), {'message': 'API rate limit exceeded'}
+
+            status, extra, body = self._route(method, path, query, headers, payload)
+            if status != 304:
+                self.remaining -= 1
+            return status, dict(self._rate_headers(), **extra), body
+
+    def _rate_headers(self):
+        return {
+            'X-RateLimit-Limit': str(self.rate_limit),
+            'X-RateLimit-Remaining': str(max(self.remaining, 0)),
+            'X-RateLimit-Reset': str(int(time.time()) + 3600)
+        }
+
+    def _route(self, method, path, query, headers, payload):
+        if path in ('/graphql', '/api/graphql'):
+            return self._graphql(payload)
+
+        match = re.fullmatch(r'/repos/[^/]+/[^/]+/issues(?:/(\d+)(/comments|/assignees)?)?', path)
+        if not match:
+            return 404, {}, {'message': 'Not Found'}
+        number, sub = match.group(1), match.group(2)
+
+        if number is None:
+            if method == 'GET':
+                return self._list_issues(query, headers)
+            if method == 'POST':
+                issue = self._create(payload['title'], payload.get('body', ''), payload.get('labels', []))
+                return 201, {}, self._public(issue)
+            return 405, {}, {'message': 'Method Not Allowed'}
+
+        issue = self.issues.get(int(number))
+        if issue is None:
+            return 404, {}, {'message': 'Not Found'}
+
+        if sub == '/comments' and method == 'POST':
+            issue['comments'].append(payload['body'])
+            return 201, {}, {'body': payload['body']}
+        if sub == '/assignees' and method == 'POST':
+            issue['assignees'].extend({'login': login} for login in payload.get('assignees', []))
+            return 201, {}, self._public(issue)
+        if sub is None and method == 'GET':
+            return 200, {}, self._public(issue)
+        if sub is None and method == 'PATCH':
+            for key in ('title', 'body', 'state'):
+                if key in payload:
+                    issue[key] = payload[key]
+            issue['updated'] = self._tick()
+            return 200, {}, self._public(issue)
+        return 405, {}, {'message': 'Method Not Allowed'}
+
+    def _matching_issues(self, labels, state='all'):
+        for issue in self.issues.values():
+            names = {label['name'] for label in issue['labels']}
+            if not set(labels) <= names:
+                continue
+            if state != 'all' and issue['state'] != state:
+                continue
+            yield issue
+
+    def _list_issues(self, query, headers):
+        labels = [label for label in query.get('labels', [''])[0].split(',') if label]
+        state = query.get('state', ['open'])[0]
+        per_page = min(int(query.get('per_page', ['30'])[0]), self.page_size)
+        page = int(query.get('page', ['1'])[0])
+
+        issues = list(self._matching_issues(labels, state))
+        if query.get('sort', [''])[0] == 'updated':
+            issues.sort(key=lambda issue: issue['updated'], reverse=query.get('direction', ['desc'])[0] == 'desc')
+        else:
+            issues.sort(key=lambda issue: issue['number'], reverse=True)
+
+        body = [self._public(issue) for issue in issues[(page - 1) * per_page:page * per_page]]
+        etag = '"' + hashlib.sha1(json.dumps(body, sort_keys=True).encode()).hexdigest() + '"'
+        if headers.get('If-None-Match') == etag:
+            return 304, {'ETag': etag}, None
+        return 200, {'ETag': etag}, body
+
+    def _graphql(self, payload):
+        query = payload.get('query', '')
+        variables = payload.get('variables') or {}
+
+        if 'query TodoIssues' in query:
+            issues = sorted(self._matching_issues(['todo']), key=lambda issue: issue['number'])
+            start = int(variables.get('cursor') or 0)
+            page = issues[start:start + min(self.page_size, variables['first'])]
+            end = start + len(page)
+            return 200, {}, {'data': {'repository': {'issues': {
+                'pageInfo': {'hasNextPage': end < len(issues), 'endCursor': str(end)},
+                'nodes': [{
+                    'id': issue['node_id'], 'number': issue['number'], 'title': issue['title'],
+                    'state': issue['state'].upper(), 'body': issue['body']
+                } for issue in page]
+            }}}}
+
+        if 'query TodoIssueCount' in query:
+            total = sum(1 for _ in self._matching_issues(['todo']))
+            return 200, {}, {'data': {'repository': {'issues': {'totalCount': total}}}}
+
+        if 'query TodoIssueStates' in query:
+            nodes = []
+            for node_id in variables.get('ids', []):
+                issue = self._by_node_id(node_id)
+                nodes.append({'id': node_id, 'state': issue['state'].upper()} if issue else None)
+            return 200, {}, {'data': {'nodes': nodes}}
+
+        if 'mutation CloseTodoIssues' in query or 'mutation CommentTodoIssues' in query:
+            self.mutation_count += 1
+            operations = [(m.start(), 'close', m.groups()) for m in CLOSE_PATTERN.finditer(query)]
+            operations += [(m.start(), 'comment', m.groups()) for m in COMMENT_PATTERN.finditer(query)]
+            data, errors = {}, []
+            for _, kind, groups in sorted(operations):
+                alias, id_var = groups[0], groups[1]
+                issue = self._by_node_id(variables.get(id_var))
+                if issue is None:
+                    data[alias] = None
+                    errors.append({'path': [alias], 'message': f"Could not resolve to a node with the global id of '{variables.get(id_var)}'"})
+                elif kind == 'close':
+                    issue['state'] = 'closed'
+                    issue['updated'] = self._tick()
+                    data[alias] = {'issue': {'number': issue['number']}}
+                else:
+                    issue['comments'].append(variables.get(groups[2]))
+                    data[alias] = {'clientMutationId': None}
+            response = {'data': data}
+            if errors:
+                response['errors'] = errors
+            return 200, {}, response
+
+        return 200, {}, {'errors': [{'message': 'Unsupported query'}]}
+
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+    fake = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = json.loads(self.rfile.read(length)) if length else {}
+        status, headers, body = self.fake.handle(method, url.path, parse_qs(url.query), self.headers, payload)
+
+        data = b'' if body is None else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PATCH(self):
+        self._dispatch('PATCH')
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a fake GitHub issues API for load testing')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of latency per request')
+    parser.add_argument('--page-size', type=int, default=100, help='Maximum issues per page')
+    parser.add_argument('--rate-limit', type=int, default=5000, help='Requests before rate limiting kicks in')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 502')
+    parser.add_argument('--seed-issues', type=int, default=0, help='Number of existing TODO issues to create')
+    args = parser.parse_args()
+
+    fake = FakeGitHub(latency=args.latency, page_size=args.page_size,
+                      rate_limit=args.rate_limit, error_rate=args.error_rate)
+    for i in range(args.seed_issues):
+        fake.add_issue(f"TODO: Seeded issue {i}", state='open' if i % 2 else 'closed')
+    fake.start(args.port)
+    print(f"Fake GitHub API listening on {fake.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+if __name__ == "__main__":
+    main()
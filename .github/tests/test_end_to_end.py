@@ -0,0 +1,243 @@
+import sys
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+from unittest import mock
+
+# Add the scripts directory to path to allow importing
+sys.path.append(str(Path(__file__).parent.parent / "scripts"))
+sys.path.append(str(Path(__file__).parent))
+
+import todo_to_issues
+from todo_to_issues import main
+from fake_github import FakeGitHub
+
+CONFIG = """
+default_labels: [todo, tech-debt]
+include_extensions: [.py]
+exclude_directories: [.git, .todo-cache]
+exclude_extensions: [.md]
+file_source: filesystem
+write_rate_per_minute: 60000
+"""
+
+class TestEndToEnd(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        Path('.github').mkdir()
+        Path('.github/todo-config.yml').write_text(CONFIG, encoding='utf-8')
+        self.fake = FakeGitHub().start()
+
+    def tearDown(self):
+        self.fake.stop()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def write(self, name, content):
+        Path(name).write_text(content, encoding='utf-8')
+
+    def run_tool(self, *extra, sha='abc1234def'):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            main(['--token', 't', '--repo', 'owner/repo', '--sha', sha, '--jobs', '1',
+                  '--api-url', self.fake.url, *extra])
+        return output.getvalue()
+
+    def issue_titled(self, title):
+        return next(issue for issue in self.fake.issues.values() if issue['title'] == title)
+
+    def test_create_then_no_op_then_close(self):
+        self.write('app.py',
+            "# TODO(TITLE: Fix login, PRIORITY: high, ASSIGNEE: octocat): Session expires\n"
+            "# TODO(TITLE: Add cache)\n"
+        )
+        self.write('util.py', "# TODO(REF: Fix login): Check here too\n")
+
+        self.run_tool()
+        login = self.issue_titled('TODO: Fix login')
+        self.assertIn('priority:high', [label['name'] for label in login['labels']])
+        self.assertEqual(login['assignees'], [{'login': 'octocat'}])
+        self.assertIn('`util.py:1`', login['body'])
+        self.assertEqual(len(self.fake.issues), 2)
+
+        # Nothing moved: a repeat run must not write anything
+        writes = self.fake.write_count()
+        self.run_tool()
+        self.assertEqual(self.fake.write_count(), writes)
+
+        # Removing a TODO closes its issue with a comment
+        self.write('app.py', "# TODO(TITLE: Fix login, PRIORITY: high): Session expires\n")
+        self.run_tool(sha='fff0000aaa')
+        cache = self.issue_titled('TODO: Add cache')
+        self.assertEqual(cache['state'], 'closed')
+        self.assertIn('fff0000', cache['comments'][0])
+        self.assertEqual(self.issue_titled('TODO: Fix login')['state'], 'open')
+
+    def test_reference_moves_are_synced(self):
+        self.write('app.py', "# TODO(TITLE: Fix login)\n")
+        self.write('util.py', "# TODO(REF: Fix login): here\n")
+        self.run_tool()
+
+        self.write('util.py', "x = 1\n\n# TODO(REF: Fix login): here\n")
+        self.run_tool()
+
+        body = self.issue_titled('TODO: Fix login')['body']
+        self.assertIn('`util.py:3`', body)
+        self.assertNotIn('`util.py:1`', body)
+
+    def test_existing_issues_and_duplicates(self):
+        self.fake.add_issue('TODO: Fix navigation menu')
+        self.write('app.py', "# TODO(TITLE: Fix navigation menus)\n")
+
+        output = self.run_tool()
+        self.run_tool(sha='fff0000aaa')
+
+        self.assertIn('Potential duplicate detected', output)
+        self.assertEqual(len(self.fake.issues), 1)
+        comments = self.fake.issues[1]['comments']
+        self.assertEqual(sum('Fix navigation menus' in comment for comment in comments), 1)
+
+    def test_transient_errors_are_retried(self):
+        self.write('app.py', "# TODO(TITLE: Fix login)\n")
+        self.fake.inject_error(502, count=2, headers={'Retry-After': '0'}, method='POST')
+
+        self.run_tool()
+
+        self.assertEqual(self.issue_titled('TODO: Fix login')['state'], 'open')
+
+    def test_mass_close_guard(self):
+        for i in range(3):
+            self.fake.add_issue(f'TODO: Old {i}')
+        Path('.github/todo-config.yml').write_text(CONFIG + "max_closes_per_run: 2\n", encoding='utf-8')
+
+        output = self.run_tool()
+
+        self.assertIn('Refusing to close 3 issues', output)
+        self.assertTrue(all(issue['state'] == 'open' for issue in self.fake.issues.values()))
+
+    def test_interrupted_sync_resumes_from_journal(self):
+        self.write('app.py', "# TODO(TITLE: Fix login)\n")
+        self.run_tool()
+
+        self.write('app.py', "# TODO(TITLE: Fix login)\n# TODO(TITLE: Add cache, ASSIGNEE: octocat)\n# TODO(TITLE: Drop v1 API)\n")
+        self.write('util.py', "# TODO(REF: Fix login): here\n")
+
+        # Die after the writes but before the state store is saved
+        def killed(*args):
+            raise KeyboardInterrupt
+        with mock.patch.object(todo_to_issues, 'save_issue_state', killed):
+            with self.assertRaises(KeyboardInterrupt):
+                self.run_tool()
+        writes = self.fake.write_count()
+
+        output = self.run_tool()
+
+        self.assertIn('Recovered 2 issue(s)', output)
+        self.assertEqual(self.fake.write_count(), writes)
+        self.assertEqual(len(self.fake.issues), 3)
+        self.assertEqual(self.issue_titled('TODO: Add cache')['assignees'], [{'login': 'octocat'}])
+
+    def test_unconfirmed_create_forces_listing(self):
+        self.write('app.py', "# TODO(TITLE: Fix login)\n")
+        self.run_tool()
+
+        # A create whose response never arrived: the issue exists but the journal cannot say so
+        self.fake.add_issue('TODO: Add cache')
+        self.write('app.py', "# TODO(TITLE: Fix login)\n# TODO(TITLE: Add cache)\n")
+        with open('.todo-cache/sync-journal.jsonl', 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'key': ['create', 'Add cache', 'abc1234def'], 'status': 'planned'}) + '\n')
+
+        output = self.run_tool()
+
+        self.assertIn('stopped while creating issues', output)
+        self.assertEqual(len(self.fake.issues), 2)
+
+    def test_max_creates_per_run_defers_the_rest(self):
+        Path('.github/todo-config.yml').write_text(CONFIG + "max_creates_per_run: 2\n", encoding='utf-8')
+        titles = ['Fix login', 'Add cache', 'Drop v1 API', 'Rotate keys', 'Speed up search']
+        self.write('app.py', ''.join(f"# TODO(TITLE: {title})\n" for title in titles))
+
+        output = self.run_tool()
+        self.assertIn('Deferred 3 new issue(s)', output)
+        self.assertEqual(len(self.fake.issues), 2)
+
+        self.run_tool()
+        self.run_tool()
+        self.assertEqual(sorted(issue['title'] for issue in self.fake.issues.values()),
+                         sorted(f'TODO: {title}' for title in titles))
+
+    def test_issues_in_skipped_files_are_not_closed(self):
+        self.write('app.py', "# TODO(TITLE: Fix login)\n")
+        self.write('util.py', "# TODO(TITLE: Add cache)\n")
+        self.run_tool()
+
+        # util.py grows past max_file_size: its TODO was not removed, just not scanned
+        Path('.github/todo-config.yml').write_text(CONFIG + "max_file_size: 64\n", encoding='utf-8')
+        self.write('util.py', "# TODO(TITLE: Add cache)\n" + "x = 1\n" * 50)
+        output = self.run_tool('--metrics-json', 'metrics.json')
+
+        self.assertIn('Warning: Could not read util.py: skipped', output)
+        issue = self.issue_titled('TODO: Add cache')
+        self.assertIn(f"Not closing issue #{issue['number']} ('Add cache')", output)
+        self.assertEqual(issue['state'], 'open')
+        metrics = json.loads(Path('metrics.json').read_text(encoding='utf-8'))
+        self.assertEqual(metrics['counters']['files_skipped'], 1)
+
+    def test_sharded_scan_then_merge_and_sync(self):
+        for i in range(6):
+            self.write(f'mod{i}.py', f"# TODO(TITLE: Task {i})\n# TODO(REF: Task {(i + 1) % 6}): from mod{i}\n")
+
+        shards = []
+        for i in (1, 2, 3):
+            path = f'.todo-cache/shard-{i}.jsonl.gz'
+            self.run_tool('--shard', f'{i}/3', '--output', path)
+            shards.append(path)
+        self.assertEqual(self.fake.write_count(), 0)
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            main(['merge-and-sync', *shards, '--token', 't', '--repo', 'owner/repo',
+                  '--sha', 'abc1234def', '--api-url', self.fake.url])
+
+        self.assertEqual(len(self.fake.issues), 6)
+        self.assertIn('`mod0.py:2`', self.issue_titled('TODO: Task 1')['body'])
+
+    def test_scan_only_then_sync_from_results(self):
+        self.write('app.py', "# TODO(TITLE: Fix login, PRIORITY: high)\n")
+        self.run_tool('--scan-only', '--output', 'results.jsonl', sha='1111111aaa')
+        self.assertEqual(self.fake.write_count(), 0)
+
+        # A failed sync can be retried from the same results without rescanning
+        self.fake.inject_error(401, count=1, method='POST')
+        Path('app.py').unlink()
+        output = io.StringIO()
+        with redirect_stdout(output):
+            main(['sync', '--from', 'results.jsonl', '--token', 't', '--repo', 'owner/repo', '--api-url', self.fake.url])
+            main(['sync', '--from', 'results.jsonl', '--token', 't', '--repo', 'owner/repo', '--api-url', self.fake.url])
+
+        issue = self.issue_titled('TODO: Fix login')
+        self.assertIn('priority:high', [label['name'] for label in issue['labels']])
+        self.assertIn('/blob/1111111aaa/app.py#L1', issue['body'])
+        self.assertEqual(len(self.fake.issues), 1)
+
+    def test_metrics_json(self):
+        self.write('app.py', "# TODO(TITLE: Fix login)\n# TODO(TITLE: Add cache)\n")
+
+        self.run_tool('--metrics-json', 'metrics.json')
+
+        metrics = json.loads(Path('metrics.json').read_text(encoding='utf-8'))
+        self.assertIn('scan', metrics['phases'])
+        self.assertIn('create', metrics['phases'])
+        self.assertEqual(metrics['counters']['issues_created'], 2)
+        self.assertEqual(metrics['api']['calls']['POST /repos/{repo}/issues'], 2)
+        self.assertEqual(metrics['api']['calls']['POST /graphql (TodoIssues)'], 1)
+        self.assertIsNotNone(metrics['api']['rate_limit_remaining'])
+
+if __name__ == '__main__':
+    unittest.main()
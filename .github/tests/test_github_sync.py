@@ -0,0 +1,379 @@
+import sys
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Add the scripts directory to path to allow importing
+sys.path.append(str(Path(__file__).parent.parent / "scripts"))
+sys.path.append(str(Path(__file__).parent))
+
+from todo_to_issues import fetch_todo_issues, IssueRecord, WriteScheduler, GitHubError, load_issue_state, save_issue_state, update_reference_section, parse_reference_section, close_issue_batch, api_endpoint, Metrics, TodoRecord, SyncJournal, GitHubClient, ISSUE_PAGE_SIZE
+from fake_github import FakeGitHub
+
+class StubResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+class StubClient:
+    """Answers the ETag probe and GraphQL pages from canned data"""
+
+    def __init__(self, pages, etag='"v1"', total=None):
+        self.pages = pages
+        self.etag = etag
+        self.total = sum(len(page) for page in pages) if total is None else total
+        self.graphql_calls = 0
+        self.graphql_variables = []
+        self.probe_headers = []
+
+    def request(self, method, path, expected=(200,), headers=None, **kwargs):
+        self.probe_headers.append(headers or {})
+        if headers and headers.get('If-None-Match') == self.etag:
+            return StubResponse(304)
+        return StubResponse(200, {'ETag': self.etag})
+
+    def graphql(self, query, variables=None):
+        if 'TodoIssueCount' in query:
+            return {'repository': {'issues': {'totalCount': self.total}}}
+        self.graphql_variables.append(variables)
+        page = self.pages[self.graphql_calls]
+        self.graphql_calls += 1
+        has_next = self.graphql_calls < len(self.pages)
+        return {'repository': {'issues': {
+            'pageInfo': {'hasNextPage': has_next, 'endCursor': str(self.graphql_calls)},
+            'nodes': page
+        }}}
+
+def node(number, title, state='OPEN'):
+    return {'id': f'I_{number}', 'number': number, 'title': title, 'state': state, 'body': 'body'}
+
+class TestFetchTodoIssues(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmp.name, 'issues.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_pages_through_graphql(self):
+        client = StubClient([[node(1, 'TODO: A')], [node(2, 'TODO: B', 'CLOSED')]])
+        records = fetch_todo_issues(client, 'owner/repo', cache_path=self.cache_path)
+
+        self.assertEqual(client.graphql_calls, 2)
+        self.assertEqual([v['first'] for v in client.graphql_variables], [ISSUE_PAGE_SIZE] * 2)
+        self.assertEqual(records, [
+            IssueRecord(1, 'TODO: A', 'open', 'body', 'I_1'),
+            IssueRecord(2, 'TODO: B', 'closed', 'body', 'I_2'),
+        ])
+
+    def test_unchanged_etag_reuses_cache(self):
+        client = StubClient([[node(1, 'TODO: A')]])
+        first = fetch_todo_issues(client, 'owner/repo', cache_path=self.cache_path)
+
+        client = StubClient([[node(1, 'TODO: changed')]])
+        second = fetch_todo_issues(client, 'owner/repo', cache_path=self.cache_path)
+
+        self.assertEqual(client.graphql_calls, 0)
+        self.assertEqual(client.probe_headers[0]['If-None-Match'], '"v1"')
+        self.assertEqual(first, second)
+
+    def test_shrunk_issue_set_refetches_despite_etag(self):
+        fetch_todo_issues(StubClient([[node(1, 'TODO: A'), node(2, 'TODO: B')]]), 'owner/repo', cache_path=self.cache_path)
+
+        # Issue 2 lost its `todo` label: the newest issue and so the ETag are unchanged
+        client = StubClient([[node(1, 'TODO: A')]])
+        records = fetch_todo_issues(client, 'owner/repo', cache_path=self.cache_path)
+
+        self.assertEqual(client.graphql_calls, 1)
+        self.assertEqual([r.number for r in records], [1])
+
+    def test_changed_etag_refetches(self):
+        fetch_todo_issues(StubClient([[node(1, 'TODO: A')]]), 'owner/repo', cache_path=self.cache_path)
+
+        client = StubClient([[node(1, 'TODO: A'), node(2, 'TODO: B')]], etag='"v2"')
+        records = fetch_todo_issues(client, 'owner/repo', cache_path=self.cache_path)
+
+        self.assertEqual(client.graphql_calls, 1)
+        self.assertEqual([r.number for r in records], [1, 2])
+
+class TestIssueStateStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.state_path = os.path.join(self.tmp.name, 'state.jsonl')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        entries = {
+            'Fix login': {'number': 3, 'state': 'open', 'node_id': 'I_3', 'refs': ['a.py:1']},
+            'Add cache': {'number': 4, 'state': 'closed', 'node_id': 'I_4', 'refs': []},
+        }
+        save_issue_state(self.state_path, 'owner/repo', entries, 1000.0)
+
+        loaded, synced_at = load_issue_state(self.state_path, 'owner/repo', max_age_days=0)
+        self.assertEqual(loaded, entries)
+        self.assertEqual(synced_at, 1000.0)
+
+    def test_stale_or_foreign_store_forces_resync(self):
+        save_issue_state(self.state_path, 'owner/repo', {}, 0.0)
+
+        self.assertIsNone(load_issue_state(self.state_path, 'owner/other', max_age_days=0))
+        self.assertIsNone(load_issue_state(self.state_path, 'owner/repo', max_age_days=7))
+        self.assertIsNone(load_issue_state(os.path.join(self.tmp.name, 'missing.jsonl'), 'owner/repo'))
+
+class TestSyncJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'journal.jsonl')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_interrupted_operations_are_replayed_or_reported(self):
+        journal = SyncJournal(self.path, 'owner/repo')
+        journal.record(journal.key('create', 'Fix login', 'abc'), lambda: {'number': 7, 'node_id': 'I_7'})
+        journal.plan(journal.key('create', 'Add cache', 'abc'))
+        journal.close()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('{"key":["close"')  # torn write from a killed run
+
+        resumed = SyncJournal(self.path, 'owner/repo')
+        calls = []
+        result = resumed.record(resumed.key('create', 'Fix login', 'abc'), calls.append, 'ran')
+        self.assertEqual(result, {'number': 7, 'node_id': 'I_7'})
+        self.assertEqual(calls, [])
+        self.assertEqual(resumed.in_flight('create'), [('create', 'Add cache', 'abc')])
+        self.assertEqual(SyncJournal(self.path, 'owner/other').done, {})
+
+    def test_finish_keeps_only_live_duplicate_comments(self):
+        journal = SyncJournal(self.path, 'owner/repo')
+        for key in (journal.key('create', 'Fix login', 'abc'), journal.key('comment', 1, 'Fix logins'),
+                    journal.key('comment', 1, 'Removed')):
+            journal.record(key, lambda: None)
+
+        journal.finish(keep=lambda key: key[2] == 'Fix logins')
+
+        self.assertEqual(list(SyncJournal(self.path, 'owner/repo').done), [('comment', '1', 'Fix logins')])
+
+class TestReferenceSection(unittest.TestCase):
+    def ref(self, file, line, description="Reference"):
+        return TodoRecord('reference', 'Fix it', file, line, '# TODO(REF: Fix it)', description)
+
+    def test_renders_sorted_section_between_markers(self):
+        body, added, removed = update_reference_section(
+            "**TODO:** Fix it", [self.ref('b.py', 10), self.ref('a.py', 9), self.ref('a.py', 20)], 'o/r', 'abc'
+        )
+
+        self.assertEqual(added, {'a.py:9', 'a.py:20', 'b.py:10'})
+        self.assertEqual(removed, set())
+        self.assertIn("<!-- todo-refs:start -->", body)
+        self.assertEqual(list(parse_reference_section(body)), ['a.py:9', 'a.py:20', 'b.py:10'])
+        self.assertTrue(body.startswith("**TODO:** Fix it\n\n### Related TODO References\n"))
+
+    def test_unchanged_refs_render_identically(self):
+        refs = [self.ref('a.py', 3, 'one')]
+        body, _, _ = update_reference_section("Body", refs, 'o/r', 'abc')
+
+        # A later commit must not rewrite permalinks of references that did not move
+        again, added, removed = update_reference_section(body, refs, 'o/r', 'def')
+        self.assertEqual(again, body)
+        self.assertEqual((added, removed), (set(), set()))
+
+    def test_diff_removes_stale_and_keeps_checked_state(self):
+        body, _, _ = update_reference_section("Body", [self.ref('a.py', 3), self.ref('b.py', 4)], 'o/r', 'abc')
+        body = body.replace("- [ ] [`b.py:4`]", "- [x] [`b.py:4`]")
+
+        new_body, added, removed = update_reference_section(
+            body + "\n\n### Notes\nkeep me", [self.ref('b.py', 4), self.ref('c.py', 1)], 'o/r', 'def'
+        )
+        entries = parse_reference_section(new_body)
+
+        self.assertEqual(added, {'c.py:1'})
+        self.assertEqual(removed, {'a.py:3'})
+        self.assertTrue(entries['b.py:4'].checked)
+        self.assertTrue(new_body.endswith("### Notes\nkeep me"))
+
+    def test_migrates_legacy_section(self):
+        legacy = (
+            "Intro\n\n### Related TODO References\n"
+            "- [ ] [`a.py:3`](https://github.com/o/r/blob/old/a.py#L3) – one\n"
+            "\n### Other\ntext"
+        )
+        body, added, removed = update_reference_section(legacy, [self.ref('a.py', 3, 'one')], 'o/r', 'new')
+
+        self.assertEqual((added, removed), (set(), set()))
+        self.assertIn("blob/old/a.py#L3", body)
+        self.assertEqual(body.count("### Related TODO References"), 1)
+        self.assertTrue(body.endswith("\n### Other\ntext"))
+
+class RecordingScheduler:
+    """Returns canned GraphQL payloads in order and records the documents sent"""
+
+    def __init__(self, payloads):
+        self.payloads = list(payloads)
+        self.sent = []
+
+    def request(self, method, url, json=None, **kwargs):
+        self.sent.append(json)
+        payload = self.payloads.pop(0)
+        response = StubResponse(200)
+        response.json = lambda: payload
+        return response
+
+class TestCloseIssueBatch(unittest.TestCase):
+    def test_closes_all_issues_in_one_mutation(self):
+        issues = [IssueRecord(1, 'TODO: A', 'open', 'b', 'I_1'), IssueRecord(2, 'TODO: B', 'open', 'b', 'I_2')]
+        scheduler = RecordingScheduler([
+            {'data': {'c0': {'issue': {'number': 1}}, 'c1': {'issue': {'number': 2}}}},
+            {'data': {'m0': {'clientMutationId': None}, 'm1': {'clientMutationId': None}}},
+        ])
+
+        results = close_issue_batch(scheduler, 'https://api/graphql', issues, 'bye')
+
+        self.assertEqual(results, {1: None, 2: None})
+        self.assertEqual(len(scheduler.sent), 2)
+        self.assertIn('c1: closeIssue(input: {issueId: $id1})', scheduler.sent[0]['query'])
+        self.assertEqual(scheduler.sent[0]['variables'], {'id0': 'I_1', 'id1': 'I_2'})
+        self.assertEqual(scheduler.sent[1]['variables'], {'body': 'bye', 'id0': 'I_1', 'id1': 'I_2'})
+
+    def test_reports_failures_per_issue(self):
+        issues = [IssueRecord(1, 'TODO: A', 'open', 'b', 'I_1'), IssueRecord(2, 'TODO: B', 'open', 'b', 'I_2')]
+        scheduler = RecordingScheduler([
+            {'data': {'c0': {'issue': {'number': 1}}, 'c1': None},
+             'errors': [{'path': ['c1'], 'message': 'not permitted'}]},
+            {'data': {'m0': None}, 'errors': [{'path': ['m0'], 'message': 'comment blocked'}]},
+        ])
+
+        results = close_issue_batch(scheduler, 'https://api/graphql', issues, 'bye')
+
+        self.assertEqual(results[1], 'closed, but comment failed: comment blocked')
+        self.assertEqual(results[2], 'not permitted')
+        # The issue that stayed open must not be told it was auto-closed
+        self.assertEqual(scheduler.sent[1]['variables'], {'body': 'bye', 'id0': 'I_1'})
+        self.assertNotIn('m1', scheduler.sent[1]['query'])
+
+    def test_no_comment_when_every_close_fails(self):
+        issues = [IssueRecord(1, 'TODO: A', 'open', 'b', 'I_1')]
+        scheduler = RecordingScheduler([
+            {'data': {'c0': None}, 'errors': [{'path': ['c0'], 'message': 'not permitted'}]},
+        ])
+
+        results = close_issue_batch(scheduler, 'https://api/graphql', issues, 'bye')
+
+        self.assertEqual(results, {1: 'not permitted'})
+        self.assertEqual(len(scheduler.sent), 1)
+
+    def test_skips_issues_closed_since_last_sync(self):
+        issues = [IssueRecord(1, 'TODO: A', 'open', None, 'I_1'), IssueRecord(2, 'TODO: B', 'open', None, 'I_2')]
+        scheduler = RecordingScheduler([
+            {'data': {'nodes': [{'id': 'I_1', 'state': 'CLOSED'}, {'id': 'I_2', 'state': 'OPEN'}]}},
+            {'data': {'c0': {'issue': {'number': 2}}}},
+            {'data': {'m0': {'clientMutationId': None}}},
+        ])
+
+        results = close_issue_batch(scheduler, 'https://api/graphql', issues, 'bye')
+
+        self.assertEqual(results, {1: 'already closed', 2: None})
+        self.assertEqual(scheduler.sent[1]['variables'], {'id0': 'I_2'})
+
+class FlakyClient:
+    """Fails with the given errors before succeeding"""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def request(self, method, path, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return StubResponse(200, {'X-RateLimit-Remaining': '4999', 'X-RateLimit-Reset': '0'})
+
+class TestWriteScheduler(unittest.TestCase):
+    def make(self, client):
+        return WriteScheduler(client, max_workers=2, rate_per_minute=60000)
+
+    def test_retries_rate_limited_requests(self):
+        client = FlakyClient([
+            GitHubError('secondary rate limit', status=429, headers={'Retry-After': '0'}),
+            GitHubError('server error', status=502, headers={'Retry-After': '0'}),
+        ])
+        scheduler = self.make(client)
+
+        response = scheduler.submit(scheduler.request, 'POST', '/x').result()
+        scheduler.shutdown()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.calls, 3)
+        self.assertEqual(scheduler.retries, 2)
+
+    def test_does_not_retry_client_errors(self):
+        client = FlakyClient([GitHubError('not found', status=404)])
+        scheduler = self.make(client)
+
+        with self.assertRaises(GitHubError):
+            scheduler.request('PATCH', '/x')
+        self.assertEqual(client.calls, 1)
+
+        client = FlakyClient([GitHubError('Must have admin rights', status=403)])
+        scheduler = self.make(client)
+        with self.assertRaises(GitHubError):
+            scheduler.request('PATCH', '/x')
+        scheduler.shutdown()
+
+    def test_stalled_requests_time_out_and_give_up(self):
+        import requests
+
+        with FakeGitHub(latency=0.5) as fake:
+            client = GitHubClient('t', fake.url, timeout=0.05)
+            scheduler = WriteScheduler(client, max_workers=1, rate_per_minute=60000, max_retries=2)
+            with mock.patch('todo_to_issues.random.random', return_value=0.0), \
+                    mock.patch.object(scheduler, 'pause'):
+                future = scheduler.submit(scheduler.request, 'POST', '/repos/o/r/issues', json={'title': 'x'})
+                with self.assertRaises(requests.Timeout):
+                    future.result(timeout=10)
+            scheduler.shutdown()
+
+        self.assertEqual(scheduler.calls, 3)
+        self.assertEqual(scheduler.retries, 2)
+
+    def test_retry_delay_honours_headers(self):
+        scheduler = self.make(FlakyClient([]))
+        error = GitHubError('limited', status=403, headers={'Retry-After': '7'})
+        self.assertEqual(scheduler.retry_delay(error, 0), 7.0)
+
+        error = GitHubError('API rate limit exceeded', status=403)
+        delay = scheduler.retry_delay(error, 3)
+        self.assertTrue(4 <= delay <= 12)
+        scheduler.shutdown()
+
+class TestMetrics(unittest.TestCase):
+    def test_endpoint_labels_are_templated(self):
+        self.assertEqual(api_endpoint('PATCH', '/repos/o/r/issues/12'), 'PATCH /repos/{repo}/issues/{number}')
+        self.assertEqual(api_endpoint('POST', 'https://api.github.com/repos/o/r/issues/3/comments'),
+                         'POST /repos/{repo}/issues/{number}/comments')
+        self.assertEqual(api_endpoint('POST', '/graphql', {'query': 'mutation CloseTodoIssues($a: ID!) {}'}),
+                         'POST /graphql (CloseTodoIssues)')
+
+    def test_phases_accumulate(self):
+        metrics = Metrics()
+        metrics.start_phase('scan')
+        with metrics.phase('duplicate_checks'):
+            pass
+        with metrics.phase('duplicate_checks'):
+            pass
+        metrics.end_phase()
+        metrics.record_api_call('GET /repos/{repo}/issues', 500, {'X-RateLimit-Remaining': '10'})
+
+        data = metrics.to_dict()
+        self.assertEqual(data['phases']['duplicate_checks']['count'], 2)
+        self.assertEqual(data['phases']['scan']['count'], 1)
+        self.assertEqual(data['api']['errors'], {'GET /repos/{repo}/issues': 1})
+        self.assertEqual(data['api']['rate_limit_remaining'], 10)
+        self.assertIn('| scan |', metrics.job_summary())
+
+if __name__ == '__main__':
+    unittest.main()
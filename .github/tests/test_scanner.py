@@ -0,0 +1,502 @@
+import sys
+import io
+import os
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+from contextlib import redirect_stdout
+from collections import Counter
+
+# Add the scripts directory to path to allow importing
+sys.path.append(str(Path(__file__).parent.parent / "scripts"))
+
+import todo_to_issues
+from todo_to_issues import scan_file, scan_files, incremental_scan, read_marker_lines, collect_candidate_files, iter_todos, marker_problems, main, load_scan_results, shard_of, stream_results, iter_results, LiveIndex, InotifyWatcher, PollingWatcher, TodoRecord, blame_enriched_results, blame_lines, extract_labels_from_metadata
+
+class TestScanner(unittest.TestCase):
+    def setUp(self):
+        self.config = {
+            'default_labels': ['todo', 'tech-debt']
+        }
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, content):
+        path = self.root / name
+        path.write_text(content, encoding='utf-8')
+        return str(path)
+
+    def test_scan_file_canonical_and_reference(self):
+        path = self.write("a.py",
+            "x = 1\n"
+            "# TODO(TITLE: Fix login, PRIORITY: high): Session expires early\n"
+            "# TODO(REF: Fix login): Also here\n"
+        )
+        records, error, bytes_read = scan_file(path, self.config)
+
+        self.assertIsNone(error)
+        self.assertEqual(bytes_read, os.path.getsize(path))
+        self.assertEqual([(record.kind, record.title) for record in records],
+                         [('canonical', 'Fix login'), ('reference', 'Fix login')])
+        self.assertEqual(records[0].line, 2)
+        self.assertEqual(records[0].description, 'Fix login: Session expires early')
+        self.assertIn('priority:high', records[0].labels(self.config))
+        self.assertEqual(records[1].description, 'Also here')
+
+    def test_read_marker_lines_only_returns_hits(self):
+        path = self.write("b.py",
+            "a = 1\r\n"
+            "# todo(TITLE: Lower case marker)\r\n"
+            "b = 2\r\n"
+            "\r\n"
+            "c = 3  # TODO(REF: Lower case marker)"
+        )
+        lines = read_marker_lines(path)
+
+        self.assertEqual([num for num, _, _ in lines], [2, 5])
+        self.assertEqual(lines[0][1].strip(), "# todo(TITLE: Lower case marker)")
+        self.assertEqual(lines[1][1], "c = 3  # TODO(REF: Lower case marker)")
+
+    def test_markers_in_language_comments(self):
+        path = self.write("app.js",
+            "const a = 1; // TODO(TITLE: Line comment)\n"
+            "/*\n"
+            " * TODO(TITLE: Block comment, PRIORITY: low): inside */ x = 2;\n"
+            "const s = '// TODO(TITLE: In a string)';\n"
+            "const t = `multi\n"
+            "# TODO(TITLE: In a template)`;\n"
+            "/* TODO(REF: Line comment) */\n"
+        )
+        records, error, _ = scan_file(path, self.config)
+
+        self.assertIsNone(error)
+        self.assertEqual([(r.line, r.kind, r.title) for r in records],
+                         [(1, 'canonical', 'Line comment'), (3, 'canonical', 'Block comment'),
+                          (7, 'reference', 'Line comment')])
+        self.assertEqual(records[1].note, 'inside')
+        self.assertEqual(records[2].description, 'Reference')
+
+    def test_strings_and_docstrings_are_ignored(self):
+        path = self.write("c.py",
+            'text = "# TODO(TITLE: Not a comment)"\n'
+            '"""\n'
+            '# TODO(TITLE: In a docstring)\n'
+            '"""\n'
+            "x = 'it''s'  # TODO(TITLE: Real one)\n"
+        )
+        sql = self.write("q.sql", "SELECT '-- TODO(TITLE: No)' FROM t; -- TODO(TITLE: Yes)\n")
+
+        self.assertEqual([r.title for r in scan_file(path, self.config)[0]], ['Real one'])
+        self.assertEqual([r.title for r in scan_file(sql, self.config)[0]], ['Yes'])
+
+    def test_comment_styles_from_config(self):
+        path = self.write("page.vue", "<!-- TODO(TITLE: Template) -->\n// TODO(TITLE: Script)\n")
+        config = dict(self.config, comment_styles={'.vue': {'line': ['//'], 'block': [['<!--', '-->']]}})
+        self.assertEqual([r.title for r in scan_file(path, config)[0]], ['Template', 'Script'])
+
+        config = dict(self.config, comment_styles={'.vue': 'javascript'})
+        self.assertEqual([r.title for r in scan_file(path, config)[0]], ['Script'])
+
+    def test_binary_and_oversized_files_are_skipped(self):
+        binary = self.root / "blob.py"
+        binary.write_bytes(b"\x00\x01# TODO(TITLE: Hidden)\n")
+        records, error, _ = scan_file(str(binary), self.config)
+        self.assertEqual(records, [])
+        self.assertIn('binary', error)
+
+        path = self.write("big.py", "# TODO(TITLE: Too big)\n" + "x = 1\n" * 100)
+        config = dict(self.config, max_file_size=64)
+        records, error, _ = scan_file(path, config)
+        self.assertEqual(records, [])
+        self.assertIn('max_file_size (64)', error)
+
+        empty = self.write("empty.py", "")
+        self.assertEqual(scan_file(empty, self.config), ([], None, 0))
+
+    def test_parallel_scan_matches_serial(self):
+        files = []
+        for i in range(80):
+            files.append(self.write(f"f{i:03d}.py",
+                f"# TODO(TITLE: Shared title): from file {i}\n"
+                f"# TODO(TITLE: Unique {i})\n"
+                f"# TODO(REF: Shared title): ref {i}\n"
+            ))
+
+        serial = scan_files(files, self.config, jobs=1)
+        parallel = scan_files(files, self.config, jobs=4)
+
+        self.assertEqual(serial[0], parallel[0])
+        self.assertEqual(dict(serial[1]), dict(parallel[1]))
+        # First occurrence wins for canonical titles
+        self.assertEqual(parallel[0]['Shared title'].file, files[0])
+        self.assertEqual(len(parallel[1]['Shared title']), 80)
+
+    def test_iter_todos_streams_records_in_order(self):
+        first = self.write("a.py", "# TODO(TITLE: One)\n# TODO(REF: One): here\n")
+        second = self.write("b.py", "# TODO(TITLE: Two, TYPE: bug)\n")
+
+        records = list(iter_todos([first, second], self.config, jobs=1))
+
+        self.assertEqual([(r.file, r.line, r.title) for r in records],
+                         [(first, 1, 'One'), (first, 2, 'One'), (second, 1, 'Two')])
+        self.assertIs(records[0].file, records[1].file)
+        self.assertEqual(records[2].labels(self.config), ['todo', 'tech-debt', 'type:bug'])
+        self.assertFalse(hasattr(records[0], '__dict__'))
+
+class TestSharding(unittest.TestCase):
+    def setUp(self):
+        self.config = {
+            'default_labels': ['todo', 'tech-debt'],
+            'include_extensions': ['.py'],
+            'exclude_extensions': [],
+            'exclude_directories': ['.todo-cache']
+        }
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        for i in range(30):
+            Path(f"f{i:02d}.py").write_text(
+                f"# TODO(TITLE: Shared {i % 4}): from {i}\n# TODO(REF: Shared {i % 3}): ref {i}\n", encoding='utf-8'
+            )
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def run_shards(self, count):
+        paths = []
+        with mock.patch.object(todo_to_issues, 'load_config', return_value=self.config):
+            for i in range(1, count + 1):
+                path = f"shard-{i}.jsonl"
+                with redirect_stdout(io.StringIO()):
+                    main(['--shard', f"{i}/{count}", '--output', path, '--file-source', 'filesystem', '--jobs', '1'])
+                paths.append(path)
+        return paths
+
+    def test_shard_assignment_is_stable(self):
+        self.assertEqual(shard_of('src/app.py', 4), shard_of(os.path.join('src', 'app.py'), 4))
+        counts = Counter(shard_of(f"f{i}.py", 3) for i in range(300))
+        self.assertEqual(sorted(counts), [1, 2, 3])
+
+    def test_merged_shards_match_serial_scan(self):
+        files = sorted(str(path) for path in Path('.').glob('*.py'))
+        serial = scan_files(files, self.config, jobs=1)
+
+        _, *merged = load_scan_results(self.run_shards(3), self.config)
+
+        self.assertEqual(merged[0], serial[0])
+        self.assertEqual(dict(merged[1]), dict(serial[1]))
+
+    def test_incomplete_shard_set_is_rejected(self):
+        paths = self.run_shards(3)
+        with self.assertRaisesRegex(ValueError, 'exactly once'):
+            load_scan_results(paths[:2], self.config)
+
+    def test_results_round_trip_and_truncation(self):
+        files = sorted(str(path) for path in Path('.').glob('*.py'))
+        serial = scan_files(files, self.config, jobs=1)
+        for path in ('results.jsonl', 'results.jsonl.gz'):
+            results = stream_results(path, todo_to_issues.iter_scan_results(files, self.config, jobs=1),
+                                     self.config, 'abc123')
+            self.assertEqual(len(list(results)), len(files))
+
+            commit, *loaded = load_scan_results([path], self.config)
+            self.assertEqual(commit, 'abc123')
+            self.assertEqual(loaded[0], serial[0])
+            self.assertEqual(dict(loaded[1]), dict(serial[1]))
+
+        # A scan that stopped early leaves a file without an end line
+        partial = stream_results('partial.jsonl', todo_to_issues.iter_scan_results(files, self.config, jobs=1),
+                                 self.config, 'abc123')
+        next(partial)
+        partial.close()
+        with self.assertRaisesRegex(ValueError, 'truncated'):
+            list(iter_results('partial.jsonl'))
+
+class TestWatch(unittest.TestCase):
+    def setUp(self):
+        self.config = {
+            'include_extensions': ['.py'],
+            'exclude_extensions': [],
+            'exclude_directories': ['node_modules']
+        }
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        Path('src').mkdir()
+        Path('node_modules').mkdir()
+        Path('src/a.py').write_text("x = 1\n", encoding='utf-8')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def record(self, kind, title, file='a.py', line=1, note=''):
+        return TodoRecord(kind, title, file, line, '', note, {})
+
+    def test_live_index_reports_changes(self):
+        index = LiveIndex()
+        self.assertEqual(index.update('a.py', [self.record('canonical', 'Login')]), [('new', 'Login', index.files['a.py'][0])])
+
+        ref = self.record('reference', 'Cache', file='b.py')
+        self.assertEqual([c[0] for c in index.update('b.py', [ref])], ['orphaned'])
+        self.assertEqual(index.orphans(), ['Cache'])
+
+        self.assertEqual([c[0] for c in index.update('a.py', [self.record('canonical', 'Login', note='more')])], ['changed'])
+        changes = index.update('c.py', [self.record('canonical', 'Cache', file='c.py')])
+        self.assertEqual([c[0] for c in changes], ['new', 'resolved'])
+
+        self.assertEqual([c[0] for c in index.update('c.py', [])], ['removed', 'orphaned'])
+        self.assertEqual(index.update('b.py', []), [])
+        self.assertEqual(index.orphans(), [])
+
+    def test_polling_watcher_reports_changed_files(self):
+        watcher = PollingWatcher(self.config, file_source='filesystem', interval=0.01)
+        Path('src/b.py').write_text("y = 2\n", encoding='utf-8')
+        Path('src/a.py').unlink()
+
+        self.assertEqual(watcher.poll(timeout=1), {os.path.join('src', 'b.py'), os.path.join('src', 'a.py')})
+        self.assertEqual(watcher.poll(timeout=0.05), set())
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'inotify is Linux-only')
+    def test_inotify_watcher_reports_changed_files(self):
+        watcher = InotifyWatcher(self.config, debounce=0.05)
+        try:
+            Path('src/a.py').write_text("# TODO(TITLE: New)\n", encoding='utf-8')
+            Path('node_modules/x.py').write_text("x\n", encoding='utf-8')
+            self.assertEqual(watcher.poll(timeout=2), {os.path.join('src', 'a.py')})
+
+            Path('src/pkg').mkdir()
+            self.assertEqual(watcher.poll(timeout=2), {os.path.join('src', 'pkg')})
+            Path('src/pkg/b.py').write_text("y\n", encoding='utf-8')
+            self.assertEqual(watcher.poll(timeout=2), {os.path.join('src', 'pkg', 'b.py')})
+            self.assertEqual(watcher.poll(timeout=0.05), set())
+        finally:
+            watcher.close()
+
+class TestCandidateFiles(unittest.TestCase):
+    def setUp(self):
+        self.config = {
+            'include_extensions': ['.py', '.js'],
+            'exclude_extensions': ['.md'],
+            'exclude_directories': ['node_modules', '.git']
+        }
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        for name in ['b.py', 'a.js', 'README.md', 'src/c.py', 'src/notes.txt',
+                     'node_modules/pkg/index.js', 'generated/out.py']:
+            Path(name).parent.mkdir(parents=True, exist_ok=True)
+            Path(name).write_text("x = 1\n", encoding='utf-8')
+        Path('.gitignore').write_text("generated/\n", encoding='utf-8')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_filesystem_walk_prunes_excluded_directories(self):
+        with mock.patch.object(os.path, 'isfile', wraps=os.path.isfile) as spy:
+            files = collect_candidate_files(self.config, source='filesystem')
+
+        self.assertEqual(files, ['a.js', 'b.py', os.path.join('generated', 'out.py'), os.path.join('src', 'c.py')])
+        self.assertFalse(any('node_modules' in call.args[0] for call in spy.call_args_list))
+
+    def test_git_source_honours_gitignore(self):
+        subprocess.run(['git', 'init', '-q'], check=True)
+        files = collect_candidate_files(self.config, source='git')
+
+        self.assertEqual(files, ['a.js', 'b.py', os.path.join('src', 'c.py')])
+
+class GitRepoTestCase(unittest.TestCase):
+    def setUp(self):
+        self.config = {
+            'default_labels': ['todo', 'tech-debt']
+        }
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        self.git('init', '-q')
+        self.git('config', 'user.email', 'test@example.com')
+        self.git('config', 'user.name', 'Test')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def git(self, *args):
+        subprocess.run(['git', *args], check=True, capture_output=True)
+
+    def commit(self, files):
+        for name, content in files.items():
+            Path(name).write_text(content, encoding='utf-8')
+        self.git('add', '-A')
+        self.git('commit', '-q', '-m', 'update')
+
+class TestIncrementalScan(GitRepoTestCase):
+    def scan(self, files):
+        with mock.patch.object(todo_to_issues, 'scan_file', wraps=scan_file) as spy:
+            result = incremental_scan(files, self.config, '.todo-cache/index.json', 'unknown-sha', jobs=1)
+        return result, sorted(call.args[0] for call in spy.call_args_list)
+
+    def test_only_changed_files_are_reparsed(self):
+        self.commit({
+            'a.py': "# TODO(TITLE: Alpha)\n",
+            'b.py': "# TODO(REF: Alpha): b\n",
+        })
+        (canonical, referenced, _), scanned = self.scan(['a.py', 'b.py'])
+        self.assertEqual(scanned, ['a.py', 'b.py'])
+        self.assertIn('Alpha', canonical)
+
+        self.commit({'b.py': "# TODO(TITLE: Beta)\n"})
+        (canonical, referenced, _), scanned = self.scan(['a.py', 'b.py'])
+        self.assertEqual(scanned, ['b.py'])
+        self.assertEqual(sorted(canonical), ['Alpha', 'Beta'])
+        self.assertNotIn('Alpha', referenced)
+
+    def test_unstaged_edits_are_reparsed(self):
+        self.commit({'a.py': "# TODO(TITLE: One)\n"})
+        self.scan(['a.py'])
+
+        Path('a.py').write_text("# TODO(TITLE: Two)\n", encoding='utf-8')
+        (canonical, _, _), scanned = self.scan(['a.py'])
+
+        self.assertEqual(scanned, ['a.py'])
+        self.assertEqual(list(canonical), ['Two'])
+
+        # Reverting the edit must not leave the dirty result in the index
+        self.git('checkout', '--', 'a.py')
+        (canonical, _, _), _ = self.scan(['a.py'])
+        self.assertEqual(list(canonical), ['One'])
+
+    def test_deleted_files_drop_out_of_index(self):
+        self.commit({
+            'a.py': "# TODO(TITLE: Alpha)\n",
+            'b.py': "# TODO(TITLE: Beta)\n",
+        })
+        self.scan(['a.py', 'b.py'])
+
+        self.git('rm', '-q', 'b.py')
+        self.git('commit', '-q', '-m', 'remove')
+        (canonical, _, _), scanned = self.scan(['a.py'])
+        self.assertEqual(scanned, [])
+        self.assertEqual(list(canonical), ['Alpha'])
+
+class TestBlameEnrichment(GitRepoTestCase):
+    def blame(self, files):
+        with mock.patch.object(todo_to_issues, 'blame_lines', wraps=blame_lines) as spy:
+            results = todo_to_issues.iter_scan_results(files, self.config, jobs=1)
+            records = [record for _, (found, *_) in blame_enriched_results(results, self.config, '.todo-cache/blame.json')
+                       for record in found]
+        return records, sorted(call.args[0] for call in spy.call_args_list)
+
+    def test_one_blame_per_file_then_cached_by_blob(self):
+        self.git('config', 'user.email', '583231+octocat@users.noreply.github.com')
+        self.git('config', 'user.name', 'The Octocat')
+        Path('a.py').write_text("# TODO(TITLE: Alpha)\nx = 1\n# TODO(TITLE: Beta, ASSIGNEE: hubot)\n", encoding='utf-8')
+        Path('b.py').write_text("y = 2\n", encoding='utf-8')
+        self.git('add', '-A')
+        self.git('commit', '-q', '-m', 'add', '--date', '2020-01-01T12:00:00Z')
+
+        records, blamed = self.blame(['a.py', 'b.py'])
+        self.assertEqual(blamed, ['a.py'])
+        alpha, beta = records
+        self.assertEqual(alpha.metadata['AUTHOR'], 'The Octocat')
+        self.assertEqual(alpha.metadata['AUTHORED'], '2020-01-01')
+        self.assertEqual(alpha.metadata['ASSIGNEE'], 'octocat')
+        self.assertEqual(beta.metadata['ASSIGNEE'], 'hubot')
+        self.assertIn('age:1-year', alpha.labels(self.config))
+
+        records, blamed = self.blame(['a.py', 'b.py'])
+        self.assertEqual(blamed, [])
+        self.assertEqual(records[0].metadata['COMMIT'], alpha.metadata['COMMIT'])
+
+    def test_author_map_and_untracked_files(self):
+        self.config['author_map'] = {'Test@Example.com': 'tester'}
+        self.commit({'a.py': "# TODO(TITLE: Alpha)\n"})
+        Path('new.py').write_text("# TODO(TITLE: Beta)\n", encoding='utf-8')
+
+        records, blamed = self.blame(['a.py', 'new.py'])
+
+        self.assertEqual(blamed, ['a.py'])
+        self.assertEqual(records[0].metadata['ASSIGNEE'], 'tester')
+        self.assertNotIn('AUTHOR', records[1].metadata)
+
+    def test_dirty_files_are_blamed_but_not_cached(self):
+        self.commit({'a.py': "x = 1\n# TODO(TITLE: Alpha)\n"})
+        Path('a.py').write_text("# TODO(TITLE: Beta)\n# TODO(TITLE: Alpha)\n", encoding='utf-8')
+
+        records, blamed = self.blame(['a.py'])
+        self.assertEqual(blamed, ['a.py'])
+        self.assertNotIn('AUTHOR', records[0].metadata)
+        self.assertEqual(records[1].metadata['AUTHOR'], 'Test')
+        # The dirty lines do not belong to the index blob, so nothing is cached for it
+        self.assertEqual(todo_to_issues.load_blame_cache('.todo-cache/blame.json'), {})
+
+    def test_age_labels_use_the_oldest_matching_bucket(self):
+        config = dict(self.config, age_labels={7: 'age:week', 90: 'age:quarter'})
+        today = todo_to_issues.datetime.date.today()
+        def labels(days):
+            authored = (today - todo_to_issues.datetime.timedelta(days=days)).isoformat()
+            return extract_labels_from_metadata({'AUTHORED': authored}, config)[2:]
+
+        self.assertEqual(labels(1), [])
+        self.assertEqual(labels(10), ['age:week'])
+        self.assertEqual(labels(400), ['age:quarter'])
+
+class TestScanCommand(GitRepoTestCase):
+    def run_scan(self, *args):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            code = main(['scan', *args])
+        return code, output.getvalue()
+
+    def test_reports_changes_against_head(self):
+        self.commit({'a.py': "# TODO(TITLE: Old one)\n# TODO(TITLE: Keep, PRIORITY: low)\n"})
+        Path('a.py').write_text("# TODO(TITLE: Keep, PRIORITY: high)\n# TODO(TITLE: Brand new)\n", encoding='utf-8')
+        Path('b.py').write_text("x = 1\n", encoding='utf-8')
+        self.git('add', 'a.py')
+
+        code, output = self.run_scan('--staged')
+
+        self.assertEqual(code, 0)
+        self.assertIn("a.py:1: changed canonical TODO: Keep", output)
+        self.assertIn("a.py:2: new canonical TODO: Brand new", output)
+        self.assertIn("a.py: removed canonical TODO: Old one", output)
+        self.assertIn("Checked 1 file(s)", output)
+
+    def test_malformed_markers_fail(self):
+        Path('a.py').write_text("# TODO(TITEL: Typo)\n# TODO(TITLE: Fine)\n", encoding='utf-8')
+        Path('notes.md').write_text("# TODO(TITEL: Ignored)\n", encoding='utf-8')
+
+        code, output = self.run_scan('a.py', 'notes.md')
+
+        self.assertEqual(code, 1)
+        self.assertIn("a.py:1: malformed TODO marker: unknown keyword 'TITEL'", output)
+        self.assertNotIn('notes.md', output)
+
+    def test_marker_problems(self):
+        self.assertEqual(marker_problems(" TODO(TITLE: Fine, PRIORITY: high, EPIC: auth)"), [])
+        self.assertEqual(marker_problems(" TODO(TITLE: Bad, PRIORITY: urgent, loose)"), [
+            "unknown PRIORITY 'urgent' (expected critical, high, medium, low)",
+            "metadata 'loose' is not KEY: value"
+        ])
+        self.assertEqual(marker_problems(" TODO(REF Missing colon)"), ["expected TODO(REF: title[, KEY: value...])"])
+        self.assertEqual(marker_problems(" TODO(TITEL Fix login)"), ["unknown keyword 'TITEL' (expected REF, TITLE)"])
+
+    def test_other_todo_conventions_pass(self):
+        self.commit({'a.py': "x = 1\n"})
+        Path('a.py').write_text("x = 1  # TODO(alice): tidy\n# see TODO() helper\n", encoding='utf-8')
+
+        code, output = self.run_scan('a.py')
+
+        self.assertEqual(code, 0)
+        self.assertNotIn('malformed TODO marker', output)
+        self.assertEqual(marker_problems(" TODO(alice): x"), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,7 +6,7 @@ from pathlib import Path
 # Add the scripts directory to path to allow importing
 sys.path.append(str(Path(__file__).parent.parent / "scripts"))
 
-from todo_to_issues import parse_metadata, extract_labels_from_metadata, similarity_ratio, find_duplicate, load_config
+from todo_to_issues import parse_metadata, extract_labels_from_metadata, similarity_ratio, find_duplicate, load_config, parse_todo_marker, DuplicateIndex
 
 class TestTodoParser(unittest.TestCase):
     def setUp(self):
@@ -64,5 +64,65 @@ class TestTodoParser(unittest.TestCase):
         match = find_duplicate("Delete user account", existing, threshold=0.8)
         self.assertIsNone(match)
 
+    def test_duplicate_index_finds_near_duplicate(self):
+        index = DuplicateIndex(["Fix navigation menu", "Update user profile", "Rewrite database layer"])
+
+        self.assertEqual(index.find("Fix navigation menus", threshold=0.8), "Fix navigation menu")
+        self.assertIsNone(index.find("Delete user account", threshold=0.8))
+
+    def test_duplicate_index_prefers_best_match(self):
+        index = DuplicateIndex(["Fix login bug in api", "Fix login bug"])
+        self.assertEqual(index.find("Fix login bugs", threshold=0.8), "Fix login bug")
+
+    def test_duplicate_index_matches_linear_scan(self):
+        titles = [f"Refactor module {i} loader" for i in range(200)]
+        index = DuplicateIndex(titles)
+        for probe in ["Refactor module 42 loaders", "Something unrelated entirely"]:
+            matches = [t for t in titles if similarity_ratio(probe, t) >= 0.9]
+            expected = max(matches, key=lambda t: similarity_ratio(probe, t)) if matches else None
+            self.assertEqual(index.find(probe, threshold=0.9), expected)
+
+    def test_duplicate_index_not_crowded_out_by_longer_titles(self):
+        cases = [
+            ([f'Fix bug in module {i}' for i in range(30)] + ['Fix bug'], 'Fix bugs'),
+            ([f'Update the user profile page layout {i}' for i in range(40)] + ['Update user profile'],
+             'Update user profiles'),
+        ]
+        for existing, probe in cases:
+            self.assertEqual(DuplicateIndex(existing).find(probe, threshold=0.85),
+                             find_duplicate(probe, existing, threshold=0.85))
+            self.assertIsNotNone(DuplicateIndex(existing).find(probe, threshold=0.85))
+
+    def test_duplicate_index_sees_added_titles(self):
+        index = DuplicateIndex()
+        self.assertIsNone(index.find("Add retry to uploader"))
+        index.add("Add retry to uploader")
+        self.assertEqual(index.find("Add retries to uploader"), "Add retry to uploader")
+
+    def test_parse_todo_marker_canonical(self):
+        marker = parse_todo_marker("    # TODO(TITLE: Fix login, PRIORITY: high, TYPE: bug): Expires early")
+        self.assertEqual(marker.kind, 'canonical')
+        self.assertEqual(marker.title, 'Fix login')
+        self.assertEqual(marker.metadata, {'PRIORITY': 'high', 'TYPE': 'bug'})
+        self.assertEqual(marker.description, 'Expires early')
+
+    def test_parse_todo_marker_reference(self):
+        marker = parse_todo_marker("x = 1  # todo(ref: Fix login)")
+        self.assertEqual(marker.kind, 'reference')
+        self.assertEqual(marker.keyword, 'REF')
+        self.assertEqual(marker.title, 'Fix login')
+        self.assertEqual(marker.metadata, {})
+        self.assertEqual(marker.description, '')
+
+    def test_parse_todo_marker_no_match(self):
+        self.assertIsNone(parse_todo_marker("# TODO: plain todo"))
+        self.assertIsNone(parse_todo_marker("# TODO(SEE: Fix login)"))
+
+    def test_parse_todo_marker_custom_keywords(self):
+        keywords = {'TITLE': 'canonical', 'REF': 'reference', 'SEE': 'reference'}
+        marker = parse_todo_marker("# TODO(SEE: Fix login): elsewhere", keywords)
+        self.assertEqual(marker.kind, 'reference')
+        self.assertEqual(marker.keyword, 'SEE')
+
 if __name__ == '__main__':
     unittest.main()